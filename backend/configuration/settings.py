@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -38,9 +39,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
+    'jobs.apps.JobsConfig',
+    'monitoring.apps.MonitoringConfig',
 
     'rest_framework',
     'rest_framework.authtoken',
@@ -49,11 +53,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'monitoring.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -92,6 +98,21 @@ DATABASES = {
     }
 }
 
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# In production point the cache at a shared backend (e.g. Redis), so that
+# version keys are visible to every gunicorn worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 AUTH_USER_MODEL = 'users.User'
 
 
@@ -135,6 +156,83 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Image uploads
+IMAGE_UPLOAD_MAX_BYTES = int(
+    os.getenv('IMAGE_UPLOAD_MAX_BYTES', 5 * 1024 * 1024)
+)
+IMAGE_UPLOAD_MAX_DIMENSION = int(
+    os.getenv('IMAGE_UPLOAD_MAX_DIMENSION', 4096)
+)
+
+# Image variants (webp; avif needs Pillow built with libavif)
+IMAGE_VARIANT_FORMATS = tuple(
+    os.getenv('IMAGE_VARIANT_FORMATS', 'webp').split(',')
+)
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+AVATAR_VARIANT_WIDTHS = (64, 128, 256)
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', 80))
+
+# Background jobs (manage.py run_worker)
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False').lower() in ('true', '1', 't')
+JOBS_CONCURRENCY = int(os.getenv('JOBS_CONCURRENCY', 2))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BACKOFF = 10
+JOBS_RETRY_BACKOFF_MAX = 3600
+JOBS_STALE_TIMEOUT = 600
+JOBS_KEEP_FINISHED = 7 * 24 * 3600
+
+# Per-request performance instrumentation (Server-Timing and logs)
+PERFORMANCE_INSTRUMENTATION = os.getenv(
+    'PERFORMANCE_INSTRUMENTATION', 'False'
+).lower() in ('true', '1', 't')
+PERFORMANCE_SLOW_QUERY_MS = float(
+    os.getenv('PERFORMANCE_SLOW_QUERY_MS', 100)
+)
+PERFORMANCE_QUERY_BUDGET = int(os.getenv('PERFORMANCE_QUERY_BUDGET', 20))
+
+# Prometheus metrics at /api/metrics, shared by workers through files
+PERFORMANCE_METRICS = os.getenv(
+    'PERFORMANCE_METRICS', 'False'
+).lower() in ('true', '1', 't')
+PERFORMANCE_METRICS_DIR = os.getenv(
+    'PERFORMANCE_METRICS_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram-metrics')
+)
+PERFORMANCE_METRICS_FLUSH_INTERVAL = float(
+    os.getenv('PERFORMANCE_METRICS_FLUSH_INTERVAL', 1)
+)
+
+# On-demand cProfile for staff and 1-in-N sampling per view
+PERFORMANCE_PROFILING = os.getenv(
+    'PERFORMANCE_PROFILING', 'False'
+).lower() in ('true', '1', 't')
+PERFORMANCE_PROFILE_SAMPLE_RATE = int(
+    os.getenv('PERFORMANCE_PROFILE_SAMPLE_RATE', 0)
+)
+PERFORMANCE_PROFILE_DIR = os.getenv(
+    'PERFORMANCE_PROFILE_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram-profiles')
+)
+PERFORMANCE_PROFILE_KEEP = int(os.getenv('PERFORMANCE_PROFILE_KEEP', 200))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'monitoring': {
+            'handlers': ['console'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -153,6 +251,22 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+# Pagination counts
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 60)
+)
+PAGINATION_EXACT_COUNT_LIMIT = int(
+    os.getenv('PAGINATION_EXACT_COUNT_LIMIT', 10000)
+)
+
+# Anonymous response cache
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
+# How often the in-process ingredient index compares itself with the DB
+INGREDIENT_INDEX_CHECK_INTERVAL = float(
+    os.getenv('INGREDIENT_INDEX_CHECK_INTERVAL', 5)
+)
+
 
 # Djoser settings
 DJOSER = {
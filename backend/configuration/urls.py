@@ -21,6 +21,7 @@ from django.urls import include, path
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/', include('monitoring.urls')),
     path('api/auth/', include('djoser.urls.authtoken')),
     path('api/', include('users.urls')),
     path('api/', include('recipes.urls')),
@@ -7,6 +7,10 @@ while ! nc -z db 5432; do
 done
 echo "PostgreSQL started"
 
+# Кэш в памяти процесса не годится для нескольких процессов gunicorn
+echo "Checking deployment settings..."
+python manage.py check --deploy --fail-level ERROR || exit 1
+
 # Применяем миграции базы данных
 echo "Applying database migrations..."
 python manage.py migrate
@@ -15,6 +19,8 @@ python manage.py migrate
 echo "Collecting static files..."
 python manage.py collectstatic --noinput --clear
 
+# Метрики прошлого запуска не должны суммироваться с новыми
+rm -rf "${PERFORMANCE_METRICS_DIR:-/tmp/foodgram-metrics}"
 
 # Запускаем основной процесс (Gunicorn)
 exec "$@"
\ No newline at end of file
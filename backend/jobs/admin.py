@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Конфигурация админ-панели для фоновых задач."""
+    list_display = ('id', 'task', 'status', 'attempts', 'duration',
+                    'run_at', 'finished_at')
+    list_filter = ('status', 'task')
+    search_fields = ('task',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at',
+                       'duration', 'last_error')
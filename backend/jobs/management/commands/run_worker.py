@@ -0,0 +1,102 @@
+import signal
+import statistics
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.models import Job
+from jobs.queue import run_job
+
+
+class Command(BaseCommand):
+    help = 'Обработчик фоновых задач из очереди в базе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.JOBS_CONCURRENCY,
+            help='Количество потоков, обрабатывающих задачи.'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.JOBS_POLL_INTERVAL,
+            help='Пауза в секундах, когда очередь пуста.'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.timings = defaultdict(list)
+        previous_handler = signal.signal(signal.SIGTERM, self.terminate)
+        Job.objects.requeue_stale()
+        concurrency = max(options['concurrency'], 1)
+        work_options = (options['poll_interval'], options['once'])
+        try:
+            if concurrency == 1:
+                self.work(*work_options)
+            else:
+                threads = [
+                    threading.Thread(
+                        target=self.work_in_thread, args=work_options,
+                        name=f'worker-{number}'
+                    )
+                    for number in range(concurrency)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    while thread.is_alive():
+                        thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop.set()
+            self.stdout.write('Остановка после текущих задач...')
+            for thread in threading.enumerate():
+                if thread.name.startswith('worker-'):
+                    thread.join()
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+        self.report()
+
+    def terminate(self, signum, frame):
+        """SIGTERM (docker stop): дорабатывает текущие задачи и выходит."""
+        self.stop.set()
+        self.stdout.write('Остановка после текущих задач...')
+
+    def work_in_thread(self, poll_interval, once):
+        try:
+            self.work(poll_interval, once)
+        finally:
+            # У каждого потока свои соединения с базой данных.
+            connections.close_all()
+
+    def work(self, poll_interval, once):
+        while not self.stop.is_set():
+            job = Job.objects.claim()
+            if job is None:
+                if once:
+                    return
+                Job.objects.requeue_stale()
+                Job.objects.purge_finished()
+                self.stop.wait(poll_interval)
+                continue
+            job = run_job(job)
+            with self.lock:
+                self.timings[job.task, job.status].append(job.duration)
+
+    def report(self):
+        for (task, status), timings in sorted(self.timings.items()):
+            self.stdout.write(
+                f'{task} [{status}]: {len(timings)} шт., '
+                f'среднее {statistics.mean(timings):.1f} мс, '
+                f'максимум {max(timings):.1f} мс'
+            )
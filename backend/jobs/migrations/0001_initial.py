@@ -0,0 +1,82 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID'
+                )),
+                ('task', models.CharField(
+                    max_length=255, verbose_name='Функция'
+                )),
+                ('args', models.JSONField(
+                    blank=True, default=list, verbose_name='Аргументы'
+                )),
+                ('status', models.CharField(
+                    choices=[
+                        ('queued', 'В очереди'),
+                        ('running', 'Выполняется'),
+                        ('done', 'Выполнена'),
+                        ('failed', 'Ошибка'),
+                    ],
+                    default='queued',
+                    max_length=16,
+                    verbose_name='Состояние'
+                )),
+                ('attempts', models.PositiveSmallIntegerField(
+                    default=0, verbose_name='Попыток'
+                )),
+                ('max_attempts', models.PositiveSmallIntegerField(
+                    default=5, verbose_name='Максимум попыток'
+                )),
+                ('run_at', models.DateTimeField(
+                    default=django.utils.timezone.now,
+                    verbose_name='Запустить после'
+                )),
+                ('created_at', models.DateTimeField(
+                    auto_now_add=True, verbose_name='Создана'
+                )),
+                ('started_at', models.DateTimeField(
+                    blank=True, null=True,
+                    verbose_name='Начало последней попытки'
+                )),
+                ('finished_at', models.DateTimeField(
+                    blank=True, null=True, verbose_name='Завершена'
+                )),
+                ('duration', models.FloatField(
+                    blank=True, null=True,
+                    verbose_name='Длительность последней попытки, мс'
+                )),
+                ('last_error', models.TextField(
+                    blank=True, verbose_name='Последняя ошибка'
+                )),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+                'ordering': ('-created_at',),
+                'indexes': [
+                    models.Index(
+                        condition=models.Q(('status', 'queued')),
+                        fields=['run_at', 'id'],
+                        name='job_queued_run_at_idx'
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class JobQuerySet(models.QuerySet):
+
+    def claim(self):
+        """
+        Забирает из очереди одну готовую к запуску задачу.
+
+        ``SELECT ... FOR UPDATE SKIP LOCKED`` пропускает строки, которые
+        уже забрали другие обработчики, поэтому они не ждут друг друга
+        и одна задача не выполняется дважды. Возвращает None, если
+        готовых задач нет.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            job = self.select_for_update(skip_locked=True).filter(
+                status=Job.Status.QUEUED, run_at__lte=now
+            ).order_by('run_at', 'id').first()
+            if job is None:
+                return None
+            job.status = Job.Status.RUNNING
+            job.attempts += 1
+            job.started_at = now
+            job.save(update_fields=('status', 'attempts', 'started_at'))
+        return job
+
+    def requeue_stale(self):
+        """Возвращает в очередь задачи упавших обработчиков."""
+        return self.filter(
+            status=Job.Status.RUNNING,
+            started_at__lt=timezone.now() - timedelta(
+                seconds=settings.JOBS_STALE_TIMEOUT
+            )
+        ).update(status=Job.Status.QUEUED, run_at=timezone.now())
+
+    def purge_finished(self):
+        """Удаляет выполненные задачи старше JOBS_KEEP_FINISHED секунд."""
+        return self.filter(
+            status=Job.Status.DONE,
+            finished_at__lt=timezone.now() - timedelta(
+                seconds=settings.JOBS_KEEP_FINISHED
+            )
+        ).delete()[0]
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди на базе данных."""
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Выполнена'
+        FAILED = 'failed', 'Ошибка'
+
+    task = models.CharField(
+        'Функция',
+        max_length=255
+    )
+    args = models.JSONField(
+        'Аргументы',
+        default=list,
+        blank=True
+    )
+    status = models.CharField(
+        'Состояние',
+        max_length=16,
+        choices=Status.choices,
+        default=Status.QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(
+        'Попыток',
+        default=0
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток',
+        default=5
+    )
+    run_at = models.DateTimeField(
+        'Запустить после',
+        default=timezone.now
+    )
+    created_at = models.DateTimeField(
+        'Создана',
+        auto_now_add=True
+    )
+    started_at = models.DateTimeField(
+        'Начало последней попытки',
+        null=True,
+        blank=True
+    )
+    finished_at = models.DateTimeField(
+        'Завершена',
+        null=True,
+        blank=True
+    )
+    duration = models.FloatField(
+        'Длительность последней попытки, мс',
+        null=True,
+        blank=True
+    )
+    last_error = models.TextField(
+        'Последняя ошибка',
+        blank=True
+    )
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('-created_at',)
+        indexes = [
+            models.Index(
+                fields=['run_at', 'id'],
+                condition=models.Q(status='queued'),
+                name='job_queued_run_at_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.task}{tuple(self.args)}'
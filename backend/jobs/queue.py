@@ -0,0 +1,73 @@
+import logging
+import time
+import traceback
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(func, *args, delay=0, max_attempts=None):
+    """
+    Ставит вызов ``func(*args)`` в очередь фоновых задач.
+
+    func должна быть функцией уровня модуля, аргументы — значениями,
+    которые сериализуются в JSON. Задача записывается в текущей
+    транзакции и станет видна обработчикам только после её коммита,
+    а при откате пропадёт вместе с остальными изменениями.
+    При JOBS_EAGER функция выполняется без очереди после коммита
+    текущей транзакции, как её выполнил бы обработчик.
+    """
+    if settings.JOBS_EAGER:
+        transaction.on_commit(partial(func, *args))
+        return None
+    return Job.objects.create(
+        task=f'{func.__module__}.{func.__qualname__}',
+        args=list(args),
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS
+    )
+
+
+def get_retry_delay(attempts):
+    """Экспоненциальная задержка перед следующей попыткой, в секундах."""
+    return min(
+        settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.JOBS_RETRY_BACKOFF_MAX
+    )
+
+
+def run_job(job):
+    """Выполняет забранную из очереди задачу и сохраняет результат."""
+    started = time.perf_counter()
+    try:
+        import_string(job.task)(*job.args)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.Status.FAILED
+            job.finished_at = timezone.now()
+        else:
+            job.status = Job.Status.QUEUED
+            job.run_at = timezone.now() + timedelta(
+                seconds=get_retry_delay(job.attempts)
+            )
+    else:
+        job.status = Job.Status.DONE
+        job.finished_at = timezone.now()
+    job.duration = (time.perf_counter() - started) * 1000
+    job.save(update_fields=(
+        'status', 'run_at', 'finished_at', 'duration', 'last_error'
+    ))
+    logger.info(
+        'Задача %s %s: %s за %.1f мс (попытка %s)',
+        job.pk, job.task, job.status, job.duration, job.attempts
+    )
+    return job
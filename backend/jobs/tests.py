@@ -0,0 +1,104 @@
+import io
+import os
+import signal
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import enqueue, get_retry_delay
+
+calls = []
+
+
+def record(value):
+    calls.append(value)
+
+
+def fail(value):
+    raise ValueError(value)
+
+
+def terminate(value):
+    calls.append(value)
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+class JobQueueTests(TestCase):
+    """Проверяет очередь фоновых задач и обработчик run_worker."""
+
+    def setUp(self):
+        calls.clear()
+
+    def run_worker(self):
+        out = io.StringIO()
+        call_command('run_worker', once=True, concurrency=1, stdout=out)
+        return out.getvalue()
+
+    def test_worker_runs_queued_jobs(self):
+        first = enqueue(record, 1)
+        enqueue(record, 2)
+        delayed = enqueue(record, 3, delay=60)
+        self.assertEqual(calls, [])
+        output = self.run_worker()
+        self.assertEqual(calls, [1, 2])
+        first.refresh_from_db()
+        self.assertEqual(first.status, Job.Status.DONE)
+        self.assertEqual(first.attempts, 1)
+        self.assertIsNotNone(first.duration)
+        self.assertIn('jobs.tests.record [done]: 2 шт.', output)
+        delayed.refresh_from_db()
+        self.assertEqual(delayed.status, Job.Status.QUEUED)
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = enqueue(fail, 'boom', max_attempts=2)
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertIn('ValueError: boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    @override_settings(JOBS_RETRY_BACKOFF=10, JOBS_RETRY_BACKOFF_MAX=60)
+    def test_retry_delay(self):
+        self.assertEqual(
+            [get_retry_delay(attempt) for attempt in range(1, 6)],
+            [10, 20, 40, 60, 60]
+        )
+
+    def test_claim_skips_taken_and_stale_jobs_are_requeued(self):
+        job = enqueue(record, 1)
+        self.assertEqual(Job.objects.claim(), job)
+        self.assertIsNone(Job.objects.claim())
+        Job.objects.filter(pk=job.pk).update(
+            started_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(Job.objects.requeue_stale(), 1)
+        self.assertEqual(Job.objects.claim(), job)
+
+    def test_sigterm_finishes_current_job(self):
+        enqueue(terminate, 1)
+        second = enqueue(record, 2)
+        out = io.StringIO()
+        call_command('run_worker', concurrency=1, stdout=out)
+        self.assertEqual(calls, [1])
+        self.assertIn('Остановка после текущих задач', out.getvalue())
+        self.assertEqual(
+            Job.objects.filter(status=Job.Status.DONE).count(), 1
+        )
+        second.refresh_from_db()
+        self.assertEqual(second.status, Job.Status.QUEUED)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(enqueue(record, 1))
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class MonitoringConfig(AppConfig):
+    name = 'monitoring'
+    verbose_name = 'Мониторинг производительности'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,270 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class MetricsStore:
+    """
+    Значения метрик, общие для всех процессов gunicorn.
+
+    Каждый процесс накапливает значения в памяти и не чаще раза
+    в PERFORMANCE_METRICS_FLUSH_INTERVAL секунд сохраняет их в свой файл
+    ``<pid>.json`` в каталоге PERFORMANCE_METRICS_DIR. При чтении
+    значения всех файлов складываются, поэтому счётчики завершившихся
+    процессов не теряются. Процесс, получивший pid завершившегося,
+    продолжает его значения, чтобы счётчики не уменьшались. Каталог
+    нужно очищать при запуске сервера.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values = None
+        self._flushed = 0
+
+    @property
+    def path(self):
+        return Path(settings.PERFORMANCE_METRICS_DIR)
+
+    def _file(self, pid):
+        return self.path / f'{pid}.json'
+
+    def _read(self, file):
+        try:
+            return json.loads(file.read_text())
+        except (OSError, ValueError):
+            # Файл удалён при очистке каталога или ещё не дописан.
+            return []
+
+    def _get_values(self):
+        # После fork, например при gunicorn --preload, значения
+        # родителя не должны попасть в файл дочернего процесса.
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._values = defaultdict(float)
+            for name, labels, value in self._read(self._file(pid)):
+                self._values[name, tuple(map(tuple, labels))] = value
+        return self._values
+
+    def add(self, name, labels, value):
+        with self._lock:
+            self._get_values()[name, labels] += value
+
+    def flush(self, force=False):
+        """
+        Сохраняет значения процесса в его файл.
+
+        Проверка интервала, запись и замена файла выполняются под
+        блокировкой: иначе потоки процесса, например запрос и чтение
+        /api/metrics, пишут в один временный файл одновременно.
+        """
+        if self._values is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if (not force and now - self._flushed
+                    < settings.PERFORMANCE_METRICS_FLUSH_INTERVAL):
+                return
+            values = [
+                (name, labels, value)
+                for (name, labels), value in self._get_values().items()
+            ]
+            self._flushed = now
+            self.path.mkdir(parents=True, exist_ok=True)
+            file = self._file(self._pid)
+            temporary = file.with_suffix('.tmp')
+            temporary.write_text(json.dumps(values))
+            os.replace(temporary, file)
+
+    def collect(self):
+        """Сумма значений всех процессов: (имя, метки) -> значение."""
+        self.flush(force=True)
+        totals = defaultdict(float)
+        for file in self.path.glob('*.json'):
+            for name, labels, value in self._read(file):
+                totals[name, tuple(map(tuple, labels))] += value
+        return totals
+
+    def clear(self):
+        """Удаляет значения всех процессов."""
+        with self._lock:
+            self._pid = self._values = None
+            for file in self.path.glob('*.json'):
+                file.unlink(missing_ok=True)
+
+
+store = MetricsStore()
+atexit.register(store.flush, force=True)
+registry = []
+
+
+class Metric(ABC):
+    type = None
+    suffix = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name + self.suffix
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.append(self)
+
+    def get_labels(self, labels):
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self, totals):
+        """Строки выборки этой метрики из собранных значений."""
+
+
+class Counter(Metric):
+    type = 'counter'
+    suffix = '_total'
+
+    def inc(self, value=1, **labels):
+        if settings.PERFORMANCE_METRICS:
+            store.add(self.name, self.get_labels(labels), value)
+
+    def samples(self, totals):
+        return sorted(
+            (sample, labels, value)
+            for (sample, labels), value in totals.items()
+            if sample == self.name
+        )
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = (*buckets, math.inf)
+
+    def observe(self, value, **labels):
+        if not settings.PERFORMANCE_METRICS:
+            return
+        labels = self.get_labels(labels)
+        # Храним только попадание в свою корзину, накопительные
+        # значения le считаются при выводе.
+        bucket = next(bound for bound in self.buckets if value <= bound)
+        store.add(
+            f'{self.name}_bucket', (*labels, ('le', format_value(bucket))), 1
+        )
+        store.add(f'{self.name}_sum', labels, value)
+        store.add(f'{self.name}_count', labels, 1)
+
+    def samples(self, totals):
+        buckets = defaultdict(dict)
+        series = {}
+        for (sample, labels), value in totals.items():
+            if sample == f'{self.name}_bucket':
+                *labels, (_, bound) = labels
+                buckets[tuple(labels)][float(bound)] = value
+            elif sample in (f'{self.name}_sum', f'{self.name}_count'):
+                series[sample, labels] = value
+        for labels in sorted(buckets):
+            total = 0
+            for bound in self.buckets:
+                total += buckets[labels].get(bound, 0)
+                yield (
+                    f'{self.name}_bucket',
+                    (*labels, ('le', format_value(bound))), total
+                )
+            for suffix in ('sum', 'count'):
+                name = f'{self.name}_{suffix}'
+                yield name, labels, series.get((name, labels), 0)
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label(value):
+    return (
+        value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+    )
+
+
+def format_sample(name, labels, value):
+    if labels:
+        name += '{%s}' % ','.join(
+            f'{label}="{escape_label(label_value)}"'
+            for label, label_value in labels
+        )
+    return f'{name} {format_value(value)}'
+
+
+def format_family(name, documentation, type, samples):
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} {type}']
+    lines.extend(format_sample(*sample) for sample in samples)
+    return lines
+
+
+def generate_latest(extra=()):
+    """
+    Метрики в текстовом формате Prometheus.
+
+    extra — дополнительные семейства (имя, описание, тип, выборка),
+    которые вычисляются при каждом запросе, например из базы данных.
+    """
+    totals = store.collect()
+    lines = []
+    for metric in registry:
+        lines.extend(format_family(
+            metric.name, metric.documentation, metric.type,
+            metric.samples(totals)
+        ))
+    for family in extra:
+        lines.extend(format_family(*family))
+    return '\n'.join(lines) + '\n'
+
+
+http_requests = Counter(
+    'foodgram_http_requests',
+    'Количество HTTP-запросов.',
+    ('method', 'route', 'status')
+)
+http_request_duration = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки HTTP-запроса.',
+    ('method', 'route')
+)
+http_request_db_duration = Histogram(
+    'foodgram_http_request_db_duration_seconds',
+    'Суммарное время SQL-запросов одного HTTP-запроса.',
+    ('method', 'route')
+)
+http_request_queries = Histogram(
+    'foodgram_http_request_queries',
+    'Количество SQL-запросов на один HTTP-запрос.',
+    ('method', 'route'),
+    buckets=QUERY_COUNT_BUCKETS
+)
+cache_requests = Counter(
+    'foodgram_cache_requests',
+    'Обращения к кэшам: попадания и промахи.',
+    ('cache', 'result')
+)
+db_connections_opened = Counter(
+    'foodgram_db_connections_opened',
+    'Открытые соединения с базой данных.',
+    ('alias',)
+)
@@ -0,0 +1,260 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import reverse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import metrics
+from .profiling import RequestProfiler
+from .sql import QueryCollector, normalize_sql
+
+logger = logging.getLogger(__name__)
+
+HTTP_METHODS = frozenset((
+    'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'
+))
+TRUE_VALUES = frozenset(('1', 'true', 'yes', 'on'))
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    if match.view_name:
+        return match.view_name
+    func = getattr(match.func, 'view_class', match.func)
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def collect_queries(collector):
+    """Передаёт collector запросы ко всем базам данных."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(collector))
+    return stack
+
+
+class PerformanceMiddleware:
+    """
+    Замеры производительности каждого запроса.
+
+    Считает SQL-запросы и их суммарное время, время представления,
+    рендеринга ответа (сериализации в JSON) и общее время. Результат
+    добавляется в заголовок ``Server-Timing`` и пишется одной
+    JSON-строкой в лог ``monitoring.middleware``. Отдельно логируются
+    запросы к базе дольше PERFORMANCE_SLOW_QUERY_MS и запросы,
+    превысившие бюджет в PERFORMANCE_QUERY_BUDGET запросов к базе.
+
+    Middleware синхронный: под ASGI Django выполняет его в том же
+    потоке, что и синхронные представления, поэтому обёртка
+    соединения видит все их запросы. У потокового ответа запросы при
+    чтении тела попадают в лог и метрики, которые пишутся после
+    передачи тела, но не в заголовок: он уходит раньше. Асинхронный
+    потоковый ответ читается в другом потоке, его запросы не
+    учитываются. Заголовок и лог
+    включаются настройкой PERFORMANCE_INSTRUMENTATION, сбор метрик
+    для /api/metrics — настройкой PERFORMANCE_METRICS.
+    """
+
+    def __init__(self, get_response):
+        if not (settings.PERFORMANCE_INSTRUMENTATION
+                or settings.PERFORMANCE_METRICS):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        request.performance = timings = {}
+        started = time.perf_counter()
+        with collect_queries(collector):
+            response = self.get_response(request)
+        finished = time.perf_counter()
+        timings['total'] = finished - started
+        if 'view_started' in timings:
+            # Для ответов без рендеринга (HttpResponse, потоковых) время
+            # представления считается до возврата ответа.
+            timings['view'] = (
+                timings.get('render_started', finished)
+                - timings['view_started']
+            )
+        if settings.PERFORMANCE_INSTRUMENTATION:
+            self.add_header(response, timings, collector)
+        if response.streaming and not response.is_async:
+            response.streaming_content = self.stream(
+                response.streaming_content, request, response, timings,
+                collector, started
+            )
+        else:
+            self.finish(request, response, timings, collector)
+        return response
+
+    def stream(self, content, request, response, timings, collector,
+               started):
+        """Тело потокового ответа с замерами запросов при его чтении."""
+        try:
+            with collect_queries(collector):
+                yield from content
+        finally:
+            timings['total'] = time.perf_counter() - started
+            self.finish(request, response, timings, collector)
+
+    def finish(self, request, response, timings, collector):
+        if settings.PERFORMANCE_INSTRUMENTATION:
+            self.log(request, response, timings, collector)
+        if settings.PERFORMANCE_METRICS:
+            self.observe(request, response, timings, collector)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.performance['view_started'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        timings = request.performance
+        timings['render_started'] = time.perf_counter()
+
+        def render_finished(response):
+            timings['render'] = (
+                time.perf_counter() - timings['render_started']
+            )
+
+        response.add_post_render_callback(render_finished)
+        return response
+
+    def add_header(self, response, timings, collector):
+        entries = [
+            f'db;dur={collector.duration:.1f};'
+            f'desc="SQL: {collector.count}"'
+        ]
+        for name, description in (('view', 'View'),
+                                  ('render', 'Serialization')):
+            if name in timings:
+                entries.append(
+                    f'{name};dur={timings[name] * 1000:.1f};'
+                    f'desc="{description}"'
+                )
+        entries.append(f'total;dur={timings["total"] * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(entries)
+
+    def log(self, request, response, timings, collector):
+        view = get_view_name(request)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'queries': collector.count,
+            'db_ms': round(collector.duration, 1),
+            'view_ms': round(timings.get('view', 0) * 1000, 1),
+            'render_ms': round(timings.get('render', 0) * 1000, 1),
+            'total_ms': round(timings['total'] * 1000, 1),
+        }, ensure_ascii=False))
+
+        for query in collector.queries:
+            if query.duration >= settings.PERFORMANCE_SLOW_QUERY_MS:
+                logger.warning(
+                    'Медленный SQL-запрос (%.1f мс) в %s: %s',
+                    query.duration, view, normalize_sql(query.sql)
+                )
+        if collector.count > settings.PERFORMANCE_QUERY_BUDGET:
+            repeated = Counter(
+                normalize_sql(query.sql) for query in collector.queries
+            ).most_common(3)
+            logger.warning(
+                'Превышен бюджет SQL-запросов в %s %s (%s): %s из %s. '
+                'Чаще всего:\n%s',
+                request.method, request.path, view, collector.count,
+                settings.PERFORMANCE_QUERY_BUDGET,
+                '\n'.join(f'{count} × {sql}' for sql, count in repeated)
+            )
+
+    def observe(self, request, response, timings, collector):
+        # Произвольные методы и пути не должны плодить метки.
+        labels = {
+            'method': (
+                request.method if request.method in HTTP_METHODS
+                else 'other'
+            ),
+            'route': get_view_name(request) or 'unmatched',
+        }
+        metrics.http_requests.inc(status=response.status_code, **labels)
+        metrics.http_request_duration.observe(timings['total'], **labels)
+        metrics.http_request_db_duration.observe(
+            collector.duration / 1000, **labels
+        )
+        metrics.http_request_queries.observe(collector.count, **labels)
+        metrics.store.flush()
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование запросов через cProfile.
+
+    Персонал включает профиль для своего запроса заголовком
+    ``X-Profile: 1`` или параметром ``?profile=1``; ссылка на отчёт
+    возвращается в заголовке ``X-Profile``. При
+    PERFORMANCE_PROFILE_SAMPLE_RATE = N дополнительно профилируется
+    каждый N-й запрос к каждому представлению в процессе. Остальные
+    запросы не профилируются и стоят одну проверку счётчика.
+    Включается настройкой PERFORMANCE_PROFILING.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        request.profiler = None
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler = request.profiler
+            if profiler is not None:
+                profiler.stop()
+        if profiler is not None:
+            profile_id = profiler.save(request, response)
+            if not profiler.sampled:
+                response['X-Profile'] = reverse(
+                    'profile-detail', args=(profile_id,)
+                )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = get_view_name(request)
+        if self.is_requested(request):
+            request.profiler = RequestProfiler(route, sampled=False)
+        elif self.is_sampled(route):
+            request.profiler = RequestProfiler(route, sampled=True)
+        else:
+            return
+        request.profiler.start()
+
+    def is_requested(self, request):
+        flag = request.headers.get('X-Profile') or request.GET.get('profile')
+        if flag is None or flag.strip().lower() not in TRUE_VALUES:
+            return False
+        if request.user.is_staff:
+            return True
+        # Токен API проверяется в представлении DRF, то есть позже.
+        try:
+            credentials = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return credentials is not None and credentials[0].is_staff
+
+    def is_sampled(self, route):
+        rate = settings.PERFORMANCE_PROFILE_SAMPLE_RATE
+        if not rate or route is None:
+            return False
+        with self.lock:
+            self.requests[route] += 1
+            return self.requests[route] % rate == 0
@@ -0,0 +1,221 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import queue
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+from .sql import QueryCollector
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{12}$')
+# Старые профили удаляются не чаще раза в PRUNE_INTERVAL секунд.
+PRUNE_INTERVAL = 60
+
+
+def get_profile_dir():
+    return Path(settings.PERFORMANCE_PROFILE_DIR)
+
+
+class RequestProfiler:
+    """
+    Профиль одного запроса: cProfile и хронология SQL-запросов.
+
+    Профилируется представление вместе с рендерингом ответа, без
+    внешних middleware.
+    """
+
+    def __init__(self, route, sampled):
+        self.route = route
+        self.sampled = sampled
+        self.profile = cProfile.Profile()
+        self.collector = QueryCollector()
+        self.stack = ExitStack()
+
+    def start(self):
+        for connection in connections.all():
+            self.stack.enter_context(
+                connection.execute_wrapper(self.collector)
+            )
+        self.started = time.perf_counter()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.duration = (time.perf_counter() - self.started) * 1000
+        self.stack.close()
+
+    def save(self, request, response):
+        """
+        Сохраняет профиль и метаданные, возвращает id профиля.
+
+        Профиль по запросу записывается сразу: ссылка на него уходит
+        в ответе. Выборочный профиль записывается фоновым потоком.
+        """
+        profile_id = (
+            f'{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:12]}'
+        )
+        metadata = {
+            'id': profile_id,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'route': self.route,
+            'status': response.status_code,
+            'sampled': self.sampled,
+            'duration_ms': round(self.duration, 1),
+            'queries': [
+                (round(query.offset, 2), round(query.duration, 2),
+                 query.sql)
+                for query in self.collector.queries
+            ],
+        }
+        item = (get_profile_dir(), self.profile, metadata)
+        if self.sampled:
+            writer.submit(item)
+        else:
+            write_profile(*item)
+            writer.submit(None)
+        return profile_id
+
+
+def write_profile(path, profile, metadata):
+    """Записывает данные cProfile и метаданные профиля."""
+    path.mkdir(parents=True, exist_ok=True)
+    profile.dump_stats(path / f'{metadata["id"]}.prof')
+    (path / f'{metadata["id"]}.json').write_text(
+        json.dumps(metadata, ensure_ascii=False)
+    )
+
+
+class ProfileWriter:
+    """
+    Фоновый поток, который записывает выборочные профили и удаляет
+    старые, чтобы запись на диск не задерживала ответ.
+
+    Поток запускается при первой задаче в каждом процессе. Когда
+    очередь заполнена, выборочный профиль отбрасывается.
+    """
+    max_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._pruned = 0
+
+    def _get_queue(self):
+        with self._lock:
+            # После fork поток родителя в дочернем процессе не работает.
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(self.max_size)
+                threading.Thread(
+                    target=self._run, args=(self._queue,),
+                    name='profile-writer', daemon=True
+                ).start()
+            return self._queue
+
+    def submit(self, item):
+        """
+        Ставит в очередь (каталог, cProfile, метаданные) или None,
+        чтобы только проверить, не пора ли удалить старые профили.
+        """
+        try:
+            self._get_queue().put_nowait(item)
+        except queue.Full:
+            pass
+
+    def flush(self):
+        """Ждёт, пока будут записаны все поставленные профили."""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def _run(self, tasks):
+        while True:
+            item = tasks.get()
+            try:
+                if item is not None:
+                    write_profile(*item)
+                if time.monotonic() - self._pruned >= PRUNE_INTERVAL:
+                    self._pruned = time.monotonic()
+                    prune_profiles()
+            except OSError:
+                logger.exception('Не удалось записать профиль')
+            finally:
+                tasks.task_done()
+
+
+writer = ProfileWriter()
+
+
+def prune_profiles():
+    """Оставляет PERFORMANCE_PROFILE_KEEP последних профилей."""
+    files = sorted(get_profile_dir().glob('*.json'), reverse=True)
+    for file in files[settings.PERFORMANCE_PROFILE_KEEP:]:
+        file.unlink(missing_ok=True)
+        file.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Метаданные сохранённых профилей без SQL, новые первыми."""
+    profiles = []
+    for file in sorted(get_profile_dir().glob('*.json'), reverse=True):
+        try:
+            data = json.loads(file.read_text())
+        except (OSError, ValueError):
+            # Профиль удалён другим процессом или ещё записывается.
+            continue
+        data['queries'] = len(data['queries'])
+        profiles.append(data)
+    return profiles
+
+
+def get_profile_files(profile_id):
+    """Пути к метаданным и данным cProfile или None, если их нет."""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = get_profile_dir()
+    files = path / f'{profile_id}.json', path / f'{profile_id}.prof'
+    if not all(file.exists() for file in files):
+        return None
+    return files
+
+
+def format_report(profile_id, limit=40):
+    """
+    Текстовый отчёт: запрос, ``limit`` самых затратных функций
+    по суммарному времени и хронология SQL-запросов.
+    """
+    files = get_profile_files(profile_id)
+    if files is None:
+        return None
+    meta_file, stats_file = files
+    data = json.loads(meta_file.read_text())
+    output = io.StringIO()
+    output.write(
+        f'{data["method"]} {data["path"]} ({data["route"]}) -> '
+        f'{data["status"]}\n'
+        f'Время: {data["duration_ms"]} мс, '
+        f'SQL-запросов: {len(data["queries"])}, '
+        f'{"выборочный" if data["sampled"] else "по запросу"} профиль '
+        f'от {data["created"]}\n\n'
+    )
+    stats = pstats.Stats(str(stats_file), stream=output)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    output.write('Хронология SQL (начало, длительность, мс):\n')
+    for offset, duration, sql in data['queries']:
+        output.write(f'{offset:>10.2f} {duration:>8.2f}  {sql}\n')
+    return output.getvalue()
@@ -0,0 +1,55 @@
+import re
+import time
+from collections import namedtuple
+
+# Строки, числа и повторяющиеся плейсхолдеры в списках IN (...).
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+WHITESPACE = re.compile(r'\s+')
+
+# Длительность и начало относительно создания сборщика, в мс.
+Query = namedtuple('Query', ('sql', 'duration', 'offset'))
+
+
+def normalize_sql(sql):
+    """
+    Приводит запрос к шаблону без конкретных значений.
+
+    Одинаковые по структуре запросы, например из цикла N+1 или
+    с разной длиной списка IN, дают одну и ту же строку.
+    """
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = PLACEHOLDER_LIST.sub('%s, ...', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryCollector:
+    """
+    Обёртка выполнения SQL (``connection.execute_wrapper``), которая
+    считает запросы и их длительность.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.started = time.perf_counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            finished = time.perf_counter()
+            self.queries.append(Query(
+                sql, (finished - started) * 1000,
+                (started - self.started) * 1000
+            ))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
@@ -0,0 +1,323 @@
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .metrics import store
+from .profiling import list_profiles, writer
+from .sql import normalize_sql
+from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+from users.models import User
+
+
+@override_settings(
+    PERFORMANCE_INSTRUMENTATION=True,
+    PERFORMANCE_SLOW_QUERY_MS=10_000,
+    PERFORMANCE_QUERY_BUDGET=20
+)
+class PerformanceMiddlewareTests(TestCase):
+    """Проверяет заголовок Server-Timing и журнал замеров."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='рецепт',
+            image='recipes/images/test.png', text='текст', cooking_time=10
+        )
+        Tag.objects.create(name='завтрак', color='#E26C2D', slug='breakfast')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def get_timings(self, response):
+        return {
+            metric.split(';')[0]: metric
+            for metric in response['Server-Timing'].split(', ')
+        }
+
+    def test_server_timing_header(self):
+        response = self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        timings = self.get_timings(response)
+        self.assertEqual(
+            set(timings), {'db', 'view', 'render', 'total'}
+        )
+        self.assertRegex(timings['db'], r'desc="SQL: \d+"')
+
+    def test_log_line(self):
+        with self.assertLogs('monitoring.middleware', 'INFO') as logs:
+            self.client.get('/api/recipes/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'recipes-list')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+
+    @override_settings(PERFORMANCE_SLOW_QUERY_MS=0, PERFORMANCE_QUERY_BUDGET=1)
+    def test_slow_queries_and_budget(self):
+        with self.assertLogs('monitoring.middleware', 'WARNING') as logs:
+            self.client.get('/api/recipes/')
+        messages = [record.getMessage() for record in logs.records]
+        self.assertTrue(any('Медленный' in message for message in messages))
+        self.assertTrue(any('бюджет' in message for message in messages))
+
+    def test_streaming_response(self):
+        ShoppingCart.objects.create(user=self.author, recipe=self.recipe)
+        with self.assertLogs('monitoring.middleware', 'INFO') as logs:
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/'
+            )
+            self.assertEqual(logs.records, [])
+            b''.join(response.streaming_content)
+        record = json.loads(logs.records[0].getMessage())
+        # Список покупок читается из базы при передаче тела.
+        header = self.get_timings(response)['db']
+        self.assertNotIn(f'SQL: {record["queries"]}"', header)
+
+    @override_settings(PERFORMANCE_INSTRUMENTATION=False)
+    def test_disabled(self):
+        response = self.client.get('/api/tags/')
+        self.assertNotIn('Server-Timing', response)
+
+    async def test_asgi(self):
+        response = await AsyncClient().get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+
+class NormalizeSqlTests(TestCase):
+
+    def test_literals_and_in_lists(self):
+        self.assertEqual(
+            normalize_sql(
+                "SELECT * FROM t WHERE a = 'x' AND b = 10 "
+                'AND c IN (%s, %s,  %s)'
+            ),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (%s, ...)'
+        )
+
+
+class MetricsTests(TestCase):
+    """Проверяет эндпоинт /api/metrics и общее хранилище метрик."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            username='staff', email='staff@example.com',
+            first_name='Staff', last_name='Staff', is_staff=True
+        )
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com',
+            first_name='User', last_name='User'
+        )
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name)
+        settings = override_settings(
+            PERFORMANCE_METRICS=True, PERFORMANCE_METRICS_DIR=directory.name
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        store.clear()
+        self.addCleanup(store.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def get_metrics(self):
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_staff_only(self):
+        for user in (None, self.user):
+            self.client.force_authenticate(user)
+            response = self.client.get('/api/metrics')
+            self.assertIn(response.status_code, (401, 403))
+
+    def test_request_metrics(self):
+        APIClient().get('/api/recipes/')
+        self.client.get('/api/tags/')
+        metrics = self.get_metrics()
+        self.assertIn(
+            'foodgram_http_requests_total{method="GET",'
+            'route="recipes-list",status="200"} 1', metrics
+        )
+        self.assertIn(
+            'foodgram_http_request_duration_seconds_bucket{method="GET",'
+            'route="recipes-list",le="+Inf"} 1', metrics
+        )
+        self.assertIn(
+            'foodgram_http_request_queries_count{method="GET",'
+            'route="tags-list"} 1', metrics
+        )
+        self.assertIn(
+            'foodgram_cache_requests_total{cache="response",result="miss"} 1',
+            metrics
+        )
+        self.assertIn('# TYPE foodgram_jobs gauge', metrics)
+        self.assertIn('foodgram_db_connections{state="active"}', metrics)
+
+    def test_catalog_lookups_count_once_per_request(self):
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(5)
+        ])
+        self.client.get('/api/ingredients/')
+        self.client.post('/api/recipes/', {
+            'name': 'рецепт',
+            'text': 'текст',
+            'cooking_time': 5,
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 1}
+                for ingredient in ingredients
+            ],
+        }, format='json')
+        metrics = self.get_metrics()
+        self.assertIn(
+            'foodgram_cache_requests_total{cache="ingredient",'
+            'result="miss"} 1', metrics
+        )
+        self.assertIn(
+            'foodgram_cache_requests_total{cache="ingredient",'
+            'result="hit"} 1', metrics
+        )
+
+    def test_concurrent_flushes(self):
+        errors = []
+
+        def flush():
+            try:
+                for _ in range(50):
+                    store.add('foodgram_test_total', (), 1)
+                    store.flush(force=True)
+            except OSError as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=flush) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(store.collect()['foodgram_test_total', ()], 200)
+
+    def test_sums_processes(self):
+        APIClient().get('/api/recipes/')
+        # Файл другого процесса gunicorn.
+        (self.path / f'{os.getpid() + 1}.json').write_text(json.dumps([
+            ['foodgram_http_requests_total',
+             [['method', 'GET'], ['route', 'recipes-list'],
+              ['status', '200']], 2],
+        ]))
+        self.assertIn(
+            'foodgram_http_requests_total{method="GET",'
+            'route="recipes-list",status="200"} 3', self.get_metrics()
+        )
+
+
+class ProfilingTests(TestCase):
+    """Проверяет профилирование по запросу и выборочное."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            username='staff', email='staff@example.com',
+            first_name='Staff', last_name='Staff', is_staff=True
+        )
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com',
+            first_name='User', last_name='User'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='рецепт',
+            image='recipes/images/test.png', text='текст', cooking_time=10
+        )
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            PERFORMANCE_PROFILING=True,
+            PERFORMANCE_PROFILE_DIR=directory.name
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.path = f'/api/recipes/{self.recipe.pk}/'
+
+    def test_requested_by_staff_token(self):
+        token = Token.objects.create(user=self.staff)
+        response = self.client.get(
+            self.path, HTTP_X_PROFILE='1',
+            HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(self.staff)
+        report = self.client.get(response['X-Profile'])
+        self.assertEqual(report.status_code, 200)
+        report = report.content.decode()
+        self.assertIn(f'GET {self.path} (recipes-detail) -> 200', report)
+        self.assertIn('function calls', report)
+        self.assertIn('Хронология SQL', report)
+        self.assertIn('SELECT', report)
+        download = self.client.get(
+            response['X-Profile'] + 'download/'
+        )
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('attachment', download['Content-Disposition'])
+
+    def test_false_flag_is_ignored(self):
+        token = Token.objects.create(user=self.staff)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        for value in ('0', 'false', 'no', ''):
+            response = self.client.get(self.path, {'profile': value})
+            self.assertNotIn('X-Profile', response)
+        response = self.client.get(self.path, {'profile': 'true'})
+        self.assertIn('X-Profile', response)
+
+    def test_ignored_for_other_users(self):
+        for user in (None, self.user):
+            self.client.force_authenticate(user)
+            response = self.client.get(self.path, {'profile': 1})
+            self.assertNotIn('X-Profile', response)
+        self.assertEqual(list_profiles(), [])
+
+    @override_settings(PERFORMANCE_PROFILE_SAMPLE_RATE=3)
+    def test_sampling(self):
+        for _ in range(7):
+            response = self.client.get(self.path)
+            self.assertNotIn('X-Profile', response)
+        self.client.get('/api/tags/')
+        writer.flush()
+        profiles = list_profiles()
+        self.assertEqual(len(profiles), 2)
+        self.assertTrue(all(
+            profile['sampled'] and profile['route'] == 'recipes-detail'
+            for profile in profiles
+        ))
+
+    def test_reports_staff_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(
+            self.client.get('/api/profiles/').status_code, 403
+        )
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(
+            self.client.get('/api/profiles/unknown/').status_code, 404
+        )
@@ -0,0 +1,19 @@
+from django.urls import path
+
+from .views import (MetricsView, ProfileDetailView, ProfileDownloadView,
+                    ProfileListView)
+
+urlpatterns = [
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('profiles/', ProfileListView.as_view(), name='profile-list'),
+    path(
+        'profiles/<str:profile_id>/',
+        ProfileDetailView.as_view(),
+        name='profile-detail'
+    ),
+    path(
+        'profiles/<str:profile_id>/download/',
+        ProfileDownloadView.as_view(),
+        name='profile-download'
+    ),
+]
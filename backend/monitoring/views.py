@@ -0,0 +1,125 @@
+from django.db import connection
+from django.db.models import Count, Min
+from django.http import FileResponse, Http404
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .metrics import generate_latest
+from .profiling import format_report, get_profile_files, list_profiles
+from jobs.models import Job
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Текстовый ответ: метрики Prometheus 0.0.4, отчёты профилировщика."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        # Ошибки, например 403, отдаются строкой с их описанием.
+        return str(data.get('detail', data)).encode(self.charset)
+
+
+class MetricsView(APIView):
+    """
+    Метрики для Prometheus: задержки и SQL-запросы по маршрутам,
+    коды ответов, попадания в кэши, соединения с базой и очередь задач.
+
+    Доступны только персоналу, Prometheus авторизуется токеном
+    служебного пользователя.
+    """
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (PlainTextRenderer,)
+
+    def get(self, request):
+        return Response(generate_latest((
+            *self.get_db_metrics(), *self.get_job_metrics()
+        )))
+
+    def get_db_metrics(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT coalesce(state, 'unknown'), count(*) "
+                'FROM pg_stat_activity '
+                "WHERE datname = current_database() "
+                "AND backend_type = 'client backend' GROUP BY 1"
+            )
+            states = cursor.fetchall()
+        yield (
+            'foodgram_db_connections',
+            'Соединения с базой данных по состоянию.',
+            'gauge',
+            [
+                ('foodgram_db_connections', (('state', state),), total)
+                for state, total in sorted(states)
+            ]
+        )
+
+    def get_job_metrics(self):
+        statuses = dict(
+            Job.objects.order_by().values_list('status')
+            .annotate(total=Count('id'))
+        )
+        yield (
+            'foodgram_jobs',
+            'Фоновые задачи по состоянию.',
+            'gauge',
+            [
+                ('foodgram_jobs', (('status', status),),
+                 statuses.get(status, 0))
+                for status in Job.Status.values
+            ]
+        )
+        oldest = Job.objects.filter(
+            status=Job.Status.QUEUED, run_at__lte=timezone.now()
+        ).aggregate(oldest=Min('run_at'))['oldest']
+        yield (
+            'foodgram_jobs_queue_lag_seconds',
+            'Сколько ждёт самая старая готовая к запуску задача.',
+            'gauge',
+            [(
+                'foodgram_jobs_queue_lag_seconds', (),
+                (timezone.now() - oldest).total_seconds() if oldest else 0
+            )]
+        )
+
+
+class ProfileListView(APIView):
+    """Сохранённые профили запросов, новые первыми."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(list_profiles())
+
+
+class ProfileDetailView(APIView):
+    """Текстовый отчёт профиля с хронологией SQL-запросов."""
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (PlainTextRenderer,)
+
+    def get(self, request, profile_id):
+        report = format_report(profile_id)
+        if report is None:
+            raise Http404
+        return Response(report)
+
+
+class ProfileDownloadView(APIView):
+    """
+    Данные cProfile для snakeviz, pstats и похожих инструментов.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, profile_id):
+        files = get_profile_files(profile_id)
+        if files is None:
+            raise Http404
+        return FileResponse(
+            open(files[1], 'rb'), as_attachment=True,
+            filename=f'{profile_id}.prof'
+        )
@@ -1,22 +1,48 @@
 from django.contrib import admin
+from django.contrib.postgres.search import SearchQuery
+from django.db.models import Count, Q
 
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+from .models import (SEARCH_CONFIG, Favorite, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, Tag)
+from .pagination import CachedCountPaginator
+from users.models import User
+
+
+class LargeTableAdminMixin:
+    """
+    Настройки списка объектов для больших таблиц.
+
+    Количество записей кэшируется и при большом числе строк берётся
+    из оценки планировщика, а общее количество без фильтров
+    («Показать все N») не считается.
+    """
+    paginator = CachedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     """Конфигурация админ-панели для тегов."""
-    list_display = ('id', 'name', 'slug', 'color')
+    list_display = ('id', 'name', 'slug', 'color', 'get_recipes_count')
     search_fields = ('name',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_total=Count('recipes')
+        )
+
+    @admin.display(description='Рецептов', ordering='recipes_total')
+    def get_recipes_count(self, obj):
+        """Возвращает количество рецептов с тегом."""
+        return obj.recipes_total
+
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Конфигурация админ-панели для ингредиентов."""
     list_display = ('id', 'name', 'measurement_unit')
-    search_fields = ('name',)
-    list_filter = ('name',)
+    # Поиск по началу названия использует ingredient_name_prefix_idx.
+    search_fields = ('^name',)
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -26,31 +52,61 @@ class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Конфигурация админ-панели для рецептов."""
-    list_display = ('id', 'name', 'author', 'get_favorite_count')
-    list_filter = ('author', 'name', 'tags')
-    search_fields = ('name', 'author__username')
+    list_display = ('id', 'name', 'author', 'pub_date', 'favorites_count',
+                    'shopping_carts_count')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('name',)
+    search_help_text = (
+        'Полнотекстовый поиск по названию и описанию, часть названия '
+        'или часть имени пользователя автора.'
+    )
+    autocomplete_fields = ('author', 'tags')
+    readonly_fields = ('favorites_count', 'shopping_carts_count')
     inlines = (RecipeIngredientInline,)
 
-    @admin.display(description='В избранном')
-    def get_favorite_count(self, obj):
-        """Возвращает количество добавлений рецепта в избранное."""
-        return obj.favorites.count()
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('search_vector')
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Ищет по индексу recipe_search_vector_idx, а части названия и
+        имени автора — по индексам recipe_name_trgm_idx и
+        user_username_trgm_idx.
+        """
+        if not search_term:
+            return queryset, False
+        return queryset.filter(
+            Q(search_vector=SearchQuery(
+                search_term, config=SEARCH_CONFIG, search_type='websearch'
+            ))
+            | Q(name__icontains=search_term)
+            | Q(author__in=User.objects.filter(
+                username__icontains=search_term
+            ).values('id'))
+        ), False
+
+
+class UserRecipeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    """Базовая конфигурация для связей пользователя и рецепта."""
+    list_display = ('id', 'user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    search_fields = ('=user__username',)
+    search_help_text = 'Точное имя пользователя.'
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(UserRecipeAdmin):
     """Конфигурация админ-панели для избранного."""
-    list_display = ('id', 'user', 'recipe')
-    search_fields = ('user__username', 'recipe__name')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(UserRecipeAdmin):
     """Конфигурация админ-панели для списка покупок."""
-    list_display = ('id', 'user', 'recipe')
-    search_fields = ('user__username', 'recipe__name')
@@ -0,0 +1,106 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .models import Ingredient
+
+INGREDIENTS_VERSION_KEY = 'recipes:ingredients:version'
+
+
+def get_ingredients_version():
+    """
+    Возвращает текущую версию справочника ингредиентов.
+
+    Версия — время последнего изменения справочника в секундах.
+    """
+    return cache.get_or_set(
+        INGREDIENTS_VERSION_KEY, lambda: repr(time.time()), timeout=None
+    )
+
+
+def bump_ingredients_version():
+    """Сообщает всем процессам, что справочник ингредиентов изменился."""
+    cache.set(INGREDIENTS_VERSION_KEY, repr(time.time()), timeout=None)
+
+
+def get_ingredients_fingerprint():
+    """
+    Количество ингредиентов и наибольший id.
+
+    Меняется при загрузке и удалении ингредиентов, даже если версию
+    в кэше не видно из этого процесса или её не сбросили.
+    """
+    return tuple(Ingredient.objects.aggregate(
+        count=Count('id'), last_id=Max('id')
+    ).values())
+
+
+class IngredientPrefixIndex:
+    """
+    Индекс ингредиентов для поиска по началу названия.
+
+    Хранит отсортированный список названий в нижнем регистре и ищет
+    префикс двоичным поиском. Индекс строится при первом запросе и
+    перестраивается, когда меняется версия справочника в кэше.
+    Кроме того, не реже раза в INGREDIENT_INDEX_CHECK_INTERVAL секунд
+    индекс сверяет с базой количество ингредиентов и наибольший id:
+    так видны загрузки командами и другими процессами, даже если кэш
+    у процессов не общий.
+    Точное совпадение всегда идёт первым: при сортировке строка
+    меньше любого своего продолжения.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = (None, None, [], [])
+        self._checked = 0
+
+    def _build(self, version):
+        fingerprint = get_ingredients_fingerprint()
+        ingredients = sorted(
+            Ingredient.objects.all(),
+            key=lambda ingredient: (ingredient.name.casefold(),
+                                    ingredient.measurement_unit)
+        )
+        keys = [ingredient.name.casefold() for ingredient in ingredients]
+        self._data = (version, fingerprint, keys, ingredients)
+        self._checked = time.monotonic()
+
+    def _is_stale(self, version):
+        current_version, fingerprint, *_ = self._data
+        if current_version != version:
+            return True
+        now = time.monotonic()
+        if now - self._checked < settings.INGREDIENT_INDEX_CHECK_INTERVAL:
+            return False
+        self._checked = now
+        return get_ingredients_fingerprint() != fingerprint
+
+    def _get_data(self):
+        version = get_ingredients_version()
+        data = self._data
+        if self._is_stale(version):
+            with self._lock:
+                # Пока ждали блокировку, индекс мог перестроить
+                # другой поток.
+                if self._data is data:
+                    self._build(version)
+        return self._data
+
+    def search(self, prefix, limit=None):
+        """Возвращает ингредиенты, название которых начинается с prefix."""
+        _, _, keys, ingredients = self._get_data()
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = start
+        stop = len(keys) if limit is None else min(len(keys), start + limit)
+        while end < stop and keys[end].startswith(prefix):
+            end += 1
+        return ingredients[start:end]
+
+
+ingredient_index = IngredientPrefixIndex()
@@ -0,0 +1,255 @@
+"""Вспомогательные функции для массовой загрузки данных."""
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import SET_NULL, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .autocomplete import bump_ingredients_version
+from .catalog import bump_tags_version
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                     ShoppingListItem, Tag)
+from .pagination import bump_counts_version
+from .response_cache import response_cache
+from .signals import COUNTERS
+from users.models import Subscription, User
+
+JSON_WHITESPACE = ' \t\n\r'
+
+
+def batched(iterable, size):
+    """Разбивает поток на списки по ``size`` элементов."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def iter_json(path, chunk_size=1024 * 1024):
+    """
+    Читает записи из JSON-массива или файла JSON Lines по одной.
+
+    Файл читается блоками по ``chunk_size`` символов, поэтому в памяти
+    держится только текущий блок, а не весь массив целиком. Записи
+    должны быть объектами: обрезанный границей блока объект
+    не декодируется и дочитывается, а обрезанное число — нет.
+    """
+    with open(path, encoding='utf-8') as file:
+        if str(path).endswith('.jsonl'):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        decoder = json.JSONDecoder()
+        buffer = file.read(chunk_size).lstrip(JSON_WHITESPACE)
+        if not buffer.startswith('['):
+            raise ValueError(f'{path}: ожидался JSON-массив.')
+        position = 1
+        while True:
+            while True:
+                while (position < len(buffer)
+                       and buffer[position] in JSON_WHITESPACE + ','):
+                    position += 1
+                if position < len(buffer):
+                    break
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    raise ValueError(f'{path}: неожиданный конец файла.')
+                buffer, position = chunk, 0
+            if buffer[position] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Запись обрезана границей блока — дочитываем файл.
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            if not isinstance(record, dict):
+                raise ValueError(f'{path}: записи должны быть объектами.')
+            yield record
+            position = end
+
+
+def truncate(*models):
+    """Очищает таблицы моделей и всех ссылающихся на них таблиц."""
+    tables = ', '.join(
+        connection.ops.quote_name(model._meta.db_table) for model in models
+    )
+    with connection.cursor() as cursor:
+        # Отложенные проверки внешних ключей из этой же транзакции
+        # запрещают TRUNCATE, поэтому выполняем их сразу.
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'TRUNCATE {tables} RESTART IDENTITY CASCADE')
+        cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+
+def delete_users():
+    """
+    Удаляет пользователей, кроме суперпользователей, и ссылающиеся на
+    них строки: токены, записи журнала админки, группы и права.
+
+    Один DELETE на таблицу без загрузки объектов и сигналов, в отличие
+    от ``QuerySet.delete()``. Ссылки на пользователей из удаляемых
+    строк не обрабатываются, поэтому таблицы рецептов и связей с
+    рецептами нужно очистить заранее.
+    """
+    quote_name = connection.ops.quote_name
+    users = (
+        f'SELECT {quote_name(User._meta.pk.column)} '
+        f'FROM {quote_name(User._meta.db_table)} WHERE NOT is_superuser'
+    )
+    relations = [
+        field for field in User._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete
+        and (field.one_to_many or field.one_to_one)
+    ]
+    with connection.cursor() as cursor:
+        for relation in relations:
+            table = quote_name(relation.related_model._meta.db_table)
+            column = quote_name(relation.field.column)
+            if relation.on_delete is SET_NULL:
+                cursor.execute(
+                    f'UPDATE {table} SET {column} = NULL '
+                    f'WHERE {column} IN ({users})'
+                )
+            else:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE {column} IN ({users})'
+                )
+        cursor.execute(
+            f'DELETE FROM {quote_name(User._meta.db_table)} '
+            f'WHERE NOT is_superuser'
+        )
+
+
+def copy_rows(model, columns, rows):
+    """
+    Записывает строки в таблицу модели через ``COPY ... FROM STDIN``.
+
+    Значения передаются в формате CSV, None записывается как NULL.
+    Пустые строки тоже становятся NULL, поэтому для необязательных
+    текстовых полей нужно передавать None.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    quote_name = connection.ops.quote_name
+    sql = (
+        f'COPY {quote_name(model._meta.db_table)} '
+        f'({", ".join(quote_name(column) for column in columns)}) '
+        f'FROM STDIN WITH (FORMAT csv)'
+    )
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(sql, buffer)
+
+
+def reset_sequences(*models):
+    """Сдвигает последовательности id после вставки с явными id."""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def clear_data():
+    """
+    Удаляет рецепты, справочники, подписки и всех пользователей,
+    кроме суперпользователей.
+
+    TRUNCATE и DELETE без ORM не загружают строки в память и не
+    вызывают сигналы на каждую удалённую строку.
+    """
+    with transaction.atomic():
+        truncate(
+            Recipe, Tag, Ingredient, Favorite, ShoppingCart,
+            ShoppingListItem, Subscription
+        )
+        delete_users()
+        User.objects.update(recipes_count=0, followers_count=0)
+
+
+def reset_caches():
+    """
+    Сбрасывает кэши справочников, количеств и ответов.
+
+    Массовая вставка не вызывает сигналы, которые делают это
+    при обычной записи.
+    """
+    bump_ingredients_version()
+    bump_tags_version()
+    bump_counts_version()
+    response_cache.invalidate('recipes', 'tags', 'ingredients')
+
+
+def live_count(related_model, attname):
+    """Подзапрос с фактическим количеством связанных записей."""
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{attname: OuterRef('pk')})
+            .order_by().values(attname).annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0)
+    )
+
+
+def refresh_counters():
+    """Пересчитывает все денормализованные счётчики по данным."""
+    for related_model, (model, attname, field) in COUNTERS.items():
+        model.objects.update(**{field: live_count(related_model, attname)})
+
+
+def refresh_shopping_lists(batch_size=1000):
+    """Заново собирает суммы списков покупок из корзин."""
+    ShoppingListItem.objects.all().delete()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for user_id, ingredient_id, amount
+            in ShoppingListItem.objects.live_totals().iterator()
+        ),
+        batch_size=batch_size
+    )
+
+
+class Progress:
+    """
+    Отчёт о ходе загрузки: количество строк и скорость в секунду.
+
+    Промежуточные строки выводятся не чаще раза в ``interval`` секунд.
+    """
+
+    def __init__(self, stdout, title, interval=5):
+        self.stdout = stdout
+        self.title = title
+        self.interval = interval
+        self.count = 0
+        self.started = self.reported = time.monotonic()
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.count / elapsed if elapsed else 0
+
+    def add(self, count):
+        self.count += count
+        now = time.monotonic()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            self.stdout.write(
+                f'{self.title}: {self.count} ({self.rate():.0f} в секунду)'
+            )
+
+    def done(self):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f'{self.title}: {self.count} за {elapsed:.1f} с '
+            f'({self.rate():.0f} в секунду)'
+        )
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+
+from .autocomplete import get_ingredients_version
+from .models import Ingredient, Tag
+from monitoring.metrics import cache_requests
+
+TAGS_VERSION_KEY = 'recipes:tags:version'
+
+
+def get_tags_version():
+    """
+    Возвращает текущую версию справочника тегов.
+
+    Версия — время последнего изменения справочника в секундах.
+    """
+    return cache.get_or_set(
+        TAGS_VERSION_KEY, lambda: repr(time.time()), timeout=None
+    )
+
+
+def bump_tags_version():
+    """Сообщает всем процессам, что справочник тегов изменился."""
+    cache.set(TAGS_VERSION_KEY, repr(time.time()), timeout=None)
+
+
+class CatalogCache:
+    """
+    Справочник в памяти процесса.
+
+    Хранит объекты, словарь id → объект, сериализованные данные и
+    готовый JSON. Справочник загружается при первом обращении и
+    перезагружается, когда меняется его версия в общем кэше, поэтому
+    в установившемся режиме база данных не используется. Объекты общие
+    для всех запросов процесса, изменять их нельзя.
+    """
+
+    def __init__(self, model, serializer_class, get_version):
+        self.model = model
+        self.serializer_class = serializer_class
+        self.get_version = get_version
+        self._lock = threading.Lock()
+        self._data = None
+
+    def __deepcopy__(self, memo):
+        # Поля сериализаторов копируются вместе с аргументами,
+        # а справочник должен оставаться общим.
+        return self
+
+    def _build(self, version):
+        objects = list(self.model.objects.all())
+        # Сериализатор импортируется здесь: serializers.py сам
+        # использует справочники для проверки входных данных.
+        serializer_class = import_string(self.serializer_class)
+        data = serializer_class(objects, many=True).data
+        self._data = {
+            'version': version,
+            'objects': objects,
+            'by_id': {obj.pk: obj for obj in objects},
+            'data': data,
+            'content': JSONRenderer().render(data),
+        }
+
+    def _get_data(self):
+        version = self.get_version()
+        data = self._data
+        if data is None or data['version'] != version:
+            with self._lock:
+                data = self._data
+                if data is None or data['version'] != version:
+                    cache_requests.inc(cache=self.model._meta.model_name,
+                                       result='miss')
+                    self._build(version)
+                    return self._data
+        cache_requests.inc(cache=self.model._meta.model_name, result='hit')
+        return data
+
+    def reset(self):
+        """Загружает справочник заново при следующем обращении."""
+        self._data = None
+
+    def all(self):
+        """Все объекты справочника."""
+        return self._get_data()['objects']
+
+    def get(self, pk):
+        """Объект по id или None."""
+        return self._get_data()['by_id'].get(pk)
+
+    def by_id(self):
+        """Словарь id → объект для поиска нескольких объектов подряд."""
+        return self._get_data()['by_id']
+
+    def data(self):
+        """Сериализованный справочник."""
+        return self._get_data()['data']
+
+    def content(self):
+        """Справочник в виде готового JSON."""
+        return self._get_data()['content']
+
+
+tag_catalog = CatalogCache(
+    Tag, 'recipes.serializers.TagSerializer', get_tags_version
+)
+ingredient_catalog = CatalogCache(
+    Ingredient, 'recipes.serializers.IngredientSerializer',
+    get_ingredients_version
+)
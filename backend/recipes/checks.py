@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Версии справочников, ETag и кэш ответов хранятся в кэше по
+    умолчанию, поэтому в рабочем окружении он должен быть общим для
+    всех процессов.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f'Кэш по умолчанию {backend} не общий для процессов: другие '
+        f'процессы не узнают об изменениях и будут отдавать '
+        f'устаревшие ответы и 304.',
+        hint='Укажите CACHE_BACKEND и CACHE_LOCATION общего кэша, '
+             'например Redis.',
+        id='recipes.E001',
+    )]
@@ -0,0 +1,74 @@
+import hashlib
+from datetime import datetime, timezone
+
+from django.db.models import Exists, OuterRef, Value
+from django.views.decorators.http import condition
+
+from .autocomplete import get_ingredients_version
+from .models import Recipe
+from users.models import Subscription
+
+
+def make_etag(*parts):
+    """Собирает ETag из значений, от которых зависит ответ."""
+    return hashlib.md5(
+        '|'.join(map(str, parts)).encode(), usedforsecurity=False
+    ).hexdigest()
+
+
+def catalog_condition(get_version):
+    """
+    Условный GET для справочника с версией в кэше.
+
+    Валидаторы строятся только из версии справочника, поэтому ответ
+    304 отдаётся без запросов к базе данных и без сериализации.
+    Версия должна лежать в общем для процессов кэше, это проверяет
+    ``check --deploy`` (recipes.E001).
+    """
+    def etag(request, *args, **kwargs):
+        return make_etag(
+            get_version(), request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', '')
+        )
+
+    def last_modified(request, *args, **kwargs):
+        return datetime.fromtimestamp(float(get_version()), tz=timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def recipe_etag(request, pk=None, **kwargs):
+    """
+    ETag рецепта для текущего пользователя.
+
+    Кроме даты изменения рецепта учитывает флаги is_favorited,
+    is_in_shopping_cart и is_subscribed, данные автора и версию
+    справочника ингредиентов. Last-Modified не отдаётся: флаги
+    пользователя меняются без изменения самого рецепта.
+    """
+    user = request.user
+    if user.is_authenticated:
+        is_subscribed = Exists(Subscription.objects.filter(
+            user=user, author=OuterRef('author')
+        ))
+    else:
+        is_subscribed = Value(False)
+    try:
+        values = Recipe.objects.filter(pk=pk).with_user_flags(
+            user
+        ).annotate(is_subscribed=is_subscribed).values_list(
+            'updated_at', 'favorites_count', 'shopping_carts_count',
+            'is_favorited', 'is_in_shopping_cart',
+            'is_subscribed', 'author__email', 'author__username',
+            'author__first_name', 'author__last_name', 'author__avatar',
+            'author__avatar_variants'
+        ).get()
+    except (Recipe.DoesNotExist, ValueError):
+        return None
+    return make_etag(
+        user.pk, get_ingredients_version(), request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''), *values
+    )
+
+
+recipe_condition = condition(etag_func=recipe_etag)
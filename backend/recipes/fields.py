@@ -1,25 +1,199 @@
 import base64
+import binascii
+import os
+import re
+import struct
 import uuid
+from io import BytesIO
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from PIL import Image
 from rest_framework import serializers
 
+# Сигнатуры поддерживаемых форматов: (начало файла, расширение, MIME).
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (b'GIF87a', 'gif', 'image/gif'),
+    (b'GIF89a', 'gif', 'image/gif'),
+)
+WHITESPACE = re.compile(r'\s')
+
+
+def variant_name(name, width, image_format):
+    """Имя файла уменьшенной копии рядом с оригиналом: ``photo_320.webp``."""
+    root, _ = os.path.splitext(name)
+    return f'{root}_{width}.{image_format}'
+
+
+def detect_image_format(header):
+    """
+    Определяет формат изображения по первым байтам файла.
+
+    Возвращает пару (расширение, MIME-тип) или None.
+    """
+    for signature, extension, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension, content_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    return None
+
 
 class Base64ImageField(serializers.ImageField):
     """
     Кастомное поле для обработки изображений, закодированных в Base64.
+
+    Строка декодируется блоками. Небольшие файлы собираются в памяти,
+    а файлы больше FILE_UPLOAD_MAX_MEMORY_SIZE пишутся во временный файл.
+    Размер файла вычисляется по длине строки и проверяется до
+    декодирования. Формат определяется по сигнатуре файла, а не по
+    MIME-типу из data URI. Переносы строк и пробелы внутри Base64
+    допускаются. Ширина и высота читаются из заголовка изображения до
+    его распаковки.
     """
+    default_error_messages = {
+        'invalid_base64': 'Некорректное изображение в формате Base64.',
+        'unsupported_format': (
+            'Неподдерживаемый формат изображения. '
+            'Допустимы PNG, JPEG, GIF и WebP.'
+        ),
+        'too_large': 'Размер файла не должен превышать {max_bytes} байт.',
+        'too_many_pixels': (
+            'Ширина и высота изображения не должны превышать '
+            '{max_dimension} пикселей.'
+        ),
+    }
+    # Кратно 4, чтобы каждый блок декодировался независимо.
+    chunk_size = 64 * 1024
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
+            data = self.decode(data)
+            self.check_dimensions(data)
+        return super().to_internal_value(data)
 
-            # Разделяем строку на формат и само изображение
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
+    def iter_chunks(self, data):
+        for offset in range(0, len(data), self.chunk_size):
+            try:
+                yield base64.b64decode(
+                    data[offset:offset + self.chunk_size], validate=True
+                )
+            except (binascii.Error, ValueError):
+                self.fail('invalid_base64')
 
-            # Генерируем уникальное имя файла
-            file_name = f'{uuid.uuid4()}.{ext}'
+    def decode(self, data):
+        marker = ';base64,'
+        start = data.find(marker)
+        if start == -1:
+            self.fail('invalid_base64')
+        data = data[start + len(marker):]
+        # Base64 из некоторых кодировщиков разбит на строки по 76 символов.
+        if WHITESPACE.search(data):
+            data = ''.join(data.split())
+        if not data or len(data) % 4:
+            self.fail('invalid_base64')
+        size = len(data) // 4 * 3 - data.count('=', len(data) - 2)
+        if size > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.fail('too_large', max_bytes=settings.IMAGE_UPLOAD_MAX_BYTES)
 
-            # Декодируем и создаем ContentFile
-            data = ContentFile(base64.b64decode(imgstr), name=file_name)
+        chunks = self.iter_chunks(data)
+        first_chunk = next(chunks)
+        image_format = detect_image_format(first_chunk)
+        if image_format is None:
+            self.fail('unsupported_format')
+        extension, content_type = image_format
 
-        return super().to_internal_value(data)
+        # Генерируем уникальное имя файла
+        file_name = f'{uuid.uuid4()}.{extension}'
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = TemporaryUploadedFile(file_name, content_type, size, None)
+        else:
+            file = InMemoryUploadedFile(
+                BytesIO(), None, file_name, content_type, size, None
+            )
+        file.write(first_chunk)
+        for chunk in chunks:
+            file.write(chunk)
+        file.seek(0)
+        return file
+
+    def check_dimensions(self, file):
+        max_dimension = settings.IMAGE_UPLOAD_MAX_DIMENSION
+        try:
+            # Image.open читает только заголовок, пиксели не распаковываются.
+            with Image.open(file) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self.fail('too_many_pixels', max_dimension=max_dimension)
+        except (OSError, SyntaxError, ValueError, struct.error):
+            # UnidentifiedImageError — подкласс OSError.
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        if width > max_dimension or height > max_dimension:
+            self.fail('too_many_pixels', max_dimension=max_dimension)
+
+
+class ImageSrcsetField(serializers.Field):
+    """
+    Уменьшенные копии изображения в формате srcset.
+
+    Возвращает словарь ``{формат: 'url 320w, url 640w'}``. Пока копии
+    не созданы или остались от прежнего изображения, словарь пуст.
+    """
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        image = getattr(obj, self.image_field)
+        variants = getattr(obj, f'{self.image_field}_variants')
+        if not image or variants.get('source') != image.name:
+            return {}
+        request = self.context.get('request')
+        srcset = {}
+        for image_format, widths in variants['formats'].items():
+            items = []
+            for width in widths:
+                url = image.storage.url(
+                    variant_name(image.name, width, image_format)
+                )
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                items.append(f'{url} {width}w')
+            srcset[image_format] = ', '.join(items)
+        return srcset
+
+
+class CatalogPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Поле id объекта справочника.
+
+    Ищет объект в справочнике в памяти процесса, а не в базе данных.
+    Поле создаётся заново для каждого сериализатора, поэтому все id
+    одного запроса ищутся в одном снимке справочника.
+    """
+    def __init__(self, catalog, **kwargs):
+        self.catalog = catalog
+        self.objects = None
+        kwargs.setdefault('queryset', catalog.model.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if self.objects is None:
+            self.objects = self.catalog.by_id()
+        obj = self.objects.get(pk)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
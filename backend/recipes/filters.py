@@ -15,10 +15,12 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.NumberFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search')
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated:
@@ -36,6 +38,9 @@ class RecipeFilter(FilterSet):
                 return queryset.exclude(shopping_cart__user=self.request.user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        return queryset.search(value)
+
 
 class IngredientSearchFilter(SearchFilter):
     """Фильтр для поиска ингредиентов по названию."""
@@ -0,0 +1,73 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .fields import variant_name
+from .models import Recipe
+from .response_cache import response_cache
+from users.models import User
+
+
+def generate_variants(field_file, widths):
+    """
+    Сохраняет уменьшенные копии изображения рядом с оригиналом.
+
+    Копии шире оригинала не создаются; если оригинал уже меньше
+    всех ширин, сохраняется одна копия исходной ширины.
+    Возвращает описание вариантов для поля ``*_variants``.
+    """
+    storage = field_file.storage
+    with field_file.open('rb') as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        widths = [width for width in widths if width < image.width]
+        widths = widths or [image.width]
+        formats = {}
+        for image_format in settings.IMAGE_VARIANT_FORMATS:
+            for width in widths:
+                height = max(1, round(image.height * width / image.width))
+                buffer = BytesIO()
+                image.resize(
+                    (width, height), Image.Resampling.LANCZOS
+                ).save(buffer, format=image_format.upper(),
+                       quality=settings.IMAGE_VARIANT_QUALITY)
+                name = variant_name(field_file.name, width, image_format)
+                storage.delete(name)
+                storage.save(name, ContentFile(buffer.getvalue()))
+            formats[image_format] = widths
+    return {'source': field_file.name, 'formats': formats}
+
+
+def has_file(field_file):
+    return bool(field_file) and field_file.storage.exists(field_file.name)
+
+
+def build_recipe_variants(recipe_id):
+    """Создаёт копии изображения рецепта. False — если файла нет."""
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not has_file(recipe.image):
+        return False
+    variants = generate_variants(recipe.image, settings.IMAGE_VARIANT_WIDTHS)
+    # Запись только если изображение не сменилось, пока шла генерация.
+    Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).update(
+        image_variants=variants, updated_at=timezone.now()
+    )
+    response_cache.invalidate('recipes', f'recipe:{recipe_id}')
+    return True
+
+
+def build_avatar_variants(user_id):
+    """Создаёт копии аватара. False — если файла нет."""
+    user = User.objects.filter(pk=user_id).only('avatar').first()
+    if user is None or not has_file(user.avatar):
+        return False
+    variants = generate_variants(user.avatar, settings.AVATAR_VARIANT_WIDTHS)
+    User.objects.filter(pk=user_id, avatar=user.avatar.name).update(
+        avatar_variants=variants
+    )
+    response_cache.invalidate(f'user:{user_id}')
+    return True
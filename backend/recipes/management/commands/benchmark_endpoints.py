@@ -0,0 +1,323 @@
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import Subscription, User
+
+SERVER_TIMING_QUERIES = re.compile(r'\bdb;[^,]*desc="SQL: (\d+)"')
+
+
+class InProcessTransport:
+    """Запросы через тестовый клиент Django с подсчётом SQL-запросов."""
+    name = 'in-process'
+
+    def __init__(self, token):
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+        self.anonymous = Client()
+
+    def request(self, method, path, params, auth):
+        client = self.client if auth else self.anonymous
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, params)
+            content = (
+                b''.join(response.streaming_content)
+                if response.streaming else response.content
+            )
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, len(content), len(queries)
+
+
+class HttpTransport:
+    """Запросы к запущенному серверу, например gunicorn."""
+    name = 'http'
+
+    def __init__(self, token, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.headers = {'Authorization': f'Token {token}'}
+
+    def request(self, method, path, params, auth):
+        started = time.perf_counter()
+        response = self.session.request(
+            method, self.base_url + path,
+            params=params if method == 'get' else None,
+            headers=self.headers if auth else None
+        )
+        elapsed = time.perf_counter() - started
+        # Количество SQL-запросов известно, только если на сервере
+        # включены замеры PERFORMANCE_INSTRUMENTATION.
+        match = SERVER_TIMING_QUERIES.search(
+            response.headers.get('Server-Timing', '')
+        )
+        return (
+            response.status_code, elapsed, len(response.content),
+            match and int(match[1])
+        )
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер основных эндпоинтов: задержка p50/p99, '
+            'SQL-запросы и размер ответа, сравнение с сохранённым '
+            'эталоном. Данные удобно готовить командой generate_dataset.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Количество замеряемых запросов на сценарий.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Количество прогревочных запросов без замера.'
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            help='Запустить только указанные сценарии.'
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например http://localhost:8000. '
+                 'Без него запросы идут через тестовый клиент.'
+        )
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого идут запросы. '
+                 'По умолчанию — пользователь с наибольшим числом подписок.'
+        )
+        parser.add_argument(
+            '--save-baseline',
+            type=Path,
+            help='Сохранить результаты как эталон в JSON-файл.'
+        )
+        parser.add_argument(
+            '--baseline',
+            type=Path,
+            help='Сравнить результаты с эталоном из JSON-файла.'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help='Допустимый рост задержки относительно эталона, доля.'
+        )
+        parser.add_argument(
+            '--min-delta',
+            type=float,
+            default=1.0,
+            help='Рост задержки меньше этого значения в мс не считается '
+                 'регрессией: на быстрых запросах шум измерений больше '
+                 'порога в процентах.'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2:
+            raise CommandError('Нужно хотя бы 2 запроса на сценарий.')
+        user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        scenarios = self.get_scenarios(user)
+        if options['scenario']:
+            unknown = set(options['scenario']) - scenarios.keys()
+            if unknown:
+                raise CommandError(
+                    f'Неизвестные сценарии: {", ".join(sorted(unknown))}. '
+                    f'Доступны: {", ".join(scenarios)}.'
+                )
+            scenarios = {
+                name: scenarios[name] for name in options['scenario']
+            }
+
+        if options['url']:
+            transport = HttpTransport(token.key, options['url'])
+            results = self.run(transport, scenarios, options)
+        else:
+            transport = InProcessTransport(token.key)
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+            ):
+                results = self.run(transport, scenarios, options)
+        self.report(results)
+
+        if options['save_baseline']:
+            options['save_baseline'].write_text(json.dumps(
+                {'transport': transport.name, 'scenarios': results},
+                ensure_ascii=False, indent=2
+            ))
+            self.stdout.write(
+                f'Эталон сохранён в {options["save_baseline"]}.'
+            )
+        if options['baseline']:
+            self.compare(
+                results, options['baseline'], transport.name,
+                options['threshold'], options['min_delta']
+            )
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+        else:
+            top = Subscription.objects.values('user_id').annotate(
+                total=Count('id')
+            ).order_by('-total', 'user_id').first()
+            user = top and User.objects.get(pk=top['user_id'])
+            user = user or User.objects.filter(is_superuser=False).first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователя для замеров. Сгенерируйте данные: '
+                'manage.py generate_dataset --scale 10000.'
+            )
+        return user
+
+    def get_scenarios(self, user):
+        """
+        Сценарии: имя -> список запросов (метод, путь, параметры,
+        с авторизацией ли). Запросы сценария выполняются по кругу.
+        """
+        recipe = Recipe.objects.order_by('-favorites_count', 'pk').first()
+        # Переключатели работают с рецептом, которого нет в избранном
+        # и корзине, чтобы каждая пара запросов возвращала данные
+        # в исходное состояние.
+        toggled = Recipe.objects.exclude(favorites__user=user).exclude(
+            shopping_cart__user=user
+        ).order_by('pk').first()
+        tag = Tag.objects.order_by('pk').first()
+        ingredient = Ingredient.objects.order_by('pk').first()
+        if recipe is None or toggled is None or ingredient is None:
+            raise CommandError('Недостаточно данных для замеров.')
+        page = {'limit': 6}
+        scenarios = {
+            'recipe_list': [('get', '/api/recipes/', page, True)],
+            'recipe_list_anonymous': [
+                ('get', '/api/recipes/', page, False)
+            ],
+            'recipe_list_filtered': [(
+                'get', '/api/recipes/',
+                {**page, 'tags': tag.slug if tag else '',
+                 'is_in_shopping_cart': 0},
+                True
+            )],
+            'recipe_detail': [
+                ('get', f'/api/recipes/{recipe.pk}/', {}, True)
+            ],
+            'subscriptions': [(
+                'get', '/api/users/subscriptions/',
+                {**page, 'recipes_limit': 3}, True
+            )],
+            'ingredient_search': [(
+                'get', '/api/ingredients/',
+                {'name': ingredient.name[:2]}, True
+            )],
+            'download_shopping_cart': [
+                ('get', '/api/recipes/download_shopping_cart/', {}, True)
+            ],
+        }
+        for action in ('favorite', 'shopping_cart'):
+            path = f'/api/recipes/{toggled.pk}/{action}/'
+            scenarios[f'{action}_toggle'] = [
+                ('post', path, {}, True), ('delete', path, {}, True)
+            ]
+        return scenarios
+
+    def run(self, transport, scenarios, options):
+        results = {}
+        for name, plan in scenarios.items():
+            timings, sizes, queries = [], [], []
+            total = options['warmup'] + options['requests']
+            for number in range(total):
+                method, path, params, auth = plan[number % len(plan)]
+                status, elapsed, size, query_count = transport.request(
+                    method, path, params, auth
+                )
+                if status >= 400:
+                    raise CommandError(
+                        f'{name}: {method.upper()} {path} вернул {status}.'
+                    )
+                if number < options['warmup']:
+                    continue
+                timings.append(elapsed * 1000)
+                sizes.append(size)
+                queries.append(query_count)
+            # Дописываем цикл до конца, чтобы переключатели вернули
+            # данные в исходное состояние.
+            if total % len(plan):
+                for method, path, params, auth in plan[total % len(plan):]:
+                    transport.request(method, path, params, auth)
+            percentiles = statistics.quantiles(timings, n=100)
+            results[name] = {
+                'p50': round(percentiles[49], 2),
+                'p99': round(percentiles[98], 2),
+                'queries': None if None in queries else max(queries),
+                'bytes': round(statistics.mean(sizes)),
+            }
+        return results
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"Сценарий":<26}{"p50, мс":>10}{"p99, мс":>10}'
+            f'{"Запросов":>10}{"Байт":>10}'
+        )
+        for name, result in results.items():
+            queries = result['queries']
+            self.stdout.write(
+                f'{name:<26}{result["p50"]:>10.2f}{result["p99"]:>10.2f}'
+                f'{"—" if queries is None else queries:>10}'
+                f'{result["bytes"]:>10}'
+            )
+
+    def compare(self, results, path, transport, threshold, min_delta):
+        """
+        Сравнивает результаты с эталоном.
+
+        Регрессия — рост p50 или p99 больше чем на ``threshold`` и
+        больше чем на ``min_delta`` мс, или любое увеличение числа
+        SQL-запросов на запрос.
+        """
+        baseline = json.loads(path.read_text())
+        if baseline['transport'] != transport:
+            raise CommandError(
+                f'Эталон снят в режиме {baseline["transport"]}, '
+                f'а замер — в режиме {transport}.'
+            )
+        regressions = []
+        for name, result in results.items():
+            expected = baseline['scenarios'].get(name)
+            if expected is None:
+                continue
+            for metric in ('p50', 'p99'):
+                limit = max(
+                    expected[metric] * (1 + threshold),
+                    expected[metric] + min_delta
+                )
+                if result[metric] > limit:
+                    regressions.append(
+                        f'{name}: {metric} {result[metric]:.2f} мс, '
+                        f'эталон {expected[metric]:.2f} мс'
+                    )
+            if (result['queries'] is not None
+                    and expected['queries'] is not None
+                    and result['queries'] > expected['queries']):
+                regressions.append(
+                    f'{name}: {result["queries"]} SQL-запросов, '
+                    f'эталон {expected["queries"]}'
+                )
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f'Регрессий: {len(regressions)}.')
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
@@ -0,0 +1,70 @@
+import base64
+import os
+import tracemalloc
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+from rest_framework import serializers
+
+from recipes.serializers import RecipeCreateUpdateSerializer
+from users.serializers import AvatarSerializer
+
+
+def decode_in_one_shot(data):
+    """Прежний способ: вся строка декодируется целиком в память."""
+    format, imgstr = data.split(';base64,')
+    ext = format.split('/')[-1]
+    file = ContentFile(base64.b64decode(imgstr), name=f'image.{ext}')
+    return serializers.ImageField().to_internal_value(file)
+
+
+class Command(BaseCommand):
+    help = ('Пиковое потребление памяти при декодировании изображений '
+            'в Base64: прежний способ против блочного')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=1000,
+            help='Ширина и высота тестового изображения в пикселях.'
+        )
+
+    def handle(self, *args, **options):
+        size = options['size']
+        # Шум почти не сжимается, PNG получается размером с сами пиксели.
+        image = Image.frombytes(
+            'RGB', (size, size), os.urandom(size * size * 3)
+        )
+        buffer = BytesIO()
+        image.save(buffer, format='PNG')
+        data = ('data:image/png;base64,'
+                + base64.b64encode(buffer.getvalue()).decode())
+        self.stdout.write(
+            f'Файл {buffer.tell() / 1024:.0f} КиБ, '
+            f'строка Base64 {len(data) / 1024:.0f} КиБ.'
+        )
+        del image, buffer
+
+        recipe_field = RecipeCreateUpdateSerializer().fields['image']
+
+        def validate_avatar(data):
+            serializer = AvatarSerializer(data={'avatar': data})
+            serializer.is_valid(raise_exception=True)
+
+        self.report('Одним куском', decode_in_one_shot, data)
+        self.report(
+            'Изображение рецепта', recipe_field.to_internal_value, data
+        )
+        self.report('AvatarSerializer', validate_avatar, data)
+
+    def report(self, title, decode, data):
+        tracemalloc.start()
+        try:
+            decode(data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.stdout.write(f'{title}: пик памяти {peak / 1024:.0f} КиБ')
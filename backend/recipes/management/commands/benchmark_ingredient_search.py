@@ -0,0 +1,80 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.autocomplete import ingredient_index
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Сравнение поиска ингредиентов по префиксу: индекс в памяти '
+            'против запроса к базе данных')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=500,
+            help='Количество поисковых запросов для каждого способа.'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Ограничение количества результатов.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора случайных префиксов.'
+        )
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('В базе нет ингредиентов.')
+        rng = random.Random(options['seed'])
+        prefixes = []
+        for _ in range(options['queries']):
+            name = rng.choice(names)
+            prefixes.append(name[:rng.randint(1, min(len(name), 4))])
+        limit = options['limit']
+
+        def search_in_database(prefix):
+            queryset = Ingredient.objects.filter(name__istartswith=prefix)
+            if limit is not None:
+                queryset = queryset[:limit]
+            return list(queryset)
+
+        # Первый вызов строит индекс, его не учитываем.
+        ingredient_index.search('')
+        index_timings = self.measure(
+            lambda prefix: ingredient_index.search(prefix, limit), prefixes
+        )
+        database_timings = self.measure(search_in_database, prefixes)
+
+        self.report('Индекс в памяти', index_timings)
+        self.report('База данных', database_timings)
+        speedup = (statistics.mean(database_timings)
+                   / statistics.mean(index_timings))
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс быстрее в {speedup:.1f} раз.'
+        ))
+
+    def measure(self, search, prefixes):
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            search(prefix)
+            timings.append((time.perf_counter() - started) * 1_000_000)
+        return timings
+
+    def report(self, title, timings):
+        percentiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f'{title}: среднее {statistics.mean(timings):.1f} мкс, '
+            f'p50 {percentiles[49]:.1f} мкс, p99 {percentiles[98]:.1f} мкс'
+        )
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_avatar_variants, build_recipe_variants
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Создание уменьшенных копий изображений рецептов и аватаров '
+            'для уже загруженных файлов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии, даже если они уже есть.'
+        )
+
+    def handle(self, *args, **options):
+        sources = (
+            ('Рецепты', Recipe.objects.exclude(image=''),
+             'image', build_recipe_variants),
+            ('Аватары', User.objects.exclude(avatar='').exclude(
+                avatar__isnull=True
+            ), 'avatar', build_avatar_variants),
+        )
+        for title, queryset, field, build in sources:
+            built = missing = failed = 0
+            rows = queryset.values_list('pk', field, f'{field}_variants')
+            for pk, name, variants in rows.iterator(chunk_size=500):
+                if not options['force'] and variants.get('source') == name:
+                    continue
+                try:
+                    if build(pk):
+                        built += 1
+                    else:
+                        missing += 1
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f'{title}, id={pk}: {error}')
+            self.stdout.write(self.style.SUCCESS(
+                f'{title}: создано {built}, нет файла {missing}, '
+                f'ошибок {failed}.'
+            ))
@@ -0,0 +1,363 @@
+import argparse
+import json
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+from PIL import Image
+
+from recipes.bulk import (Progress, clear_data, copy_rows, refresh_counters,
+                          refresh_shopping_lists, reset_caches,
+                          reset_sequences)
+from recipes.images import generate_variants
+from recipes.management.commands.load_data import TAGS
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription, User
+
+DISHES = (
+    'суп', 'борщ', 'салат', 'омлет', 'плов', 'пирог', 'рагу', 'каша',
+    'запеканка', 'блины', 'котлеты', 'паста', 'ризотто', 'соус', 'торт',
+    'пицца', 'жаркое', 'сырники', 'оладьи', 'голубцы',
+)
+ADJECTIVES = (
+    'домашний', 'быстрый', 'летний', 'острый', 'сытный', 'лёгкий',
+    'праздничный', 'бабушкин', 'овощной', 'сливочный', 'пряный',
+    'деревенский',
+)
+FILLINGS = (
+    'с грибами', 'с курицей', 'с сыром', 'с тыквой', 'с яблоками',
+    'с говядиной', 'с креветками', 'со шпинатом', 'с чесноком',
+    'с ягодами', 'с зеленью', 'с картофелем',
+)
+STEPS = (
+    'Нарежьте овощи.', 'Разогрейте духовку до 180 градусов.',
+    'Обжарьте на среднем огне до золотистого цвета.',
+    'Посолите и поперчите по вкусу.', 'Тушите под крышкой 20 минут.',
+    'Взбейте яйца с молоком.', 'Подавайте горячим.',
+    'Дайте настояться перед подачей.', 'Украсьте зеленью.',
+)
+INGREDIENT_WORDS = (
+    'мука', 'сахар', 'соль', 'молоко', 'масло', 'яйца', 'сыр', 'лук',
+    'морковь', 'картофель', 'чеснок', 'томаты', 'курица', 'говядина',
+    'рис', 'гречка', 'сметана', 'творог', 'перец', 'зелень',
+)
+UNITS = ('г', 'мл', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+IMAGE_NAME = 'recipes/images/generated.png'
+# Точка отсчёта дат по умолчанию: данные не зависят от времени запуска.
+DEFAULT_NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def aware_datetime(value):
+    """Дата и время из командной строки, без зоны считается UTC."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise argparse.ArgumentTypeError(
+            f'Некорректная дата и время: {value}.'
+        )
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class ZipfSampler:
+    """
+    Случайные индексы 0..n-1 с распределением Ципфа.
+
+    Объект ранга k выпадает с вероятностью, пропорциональной 1 / k^s.
+    Ранг вычисляется обратной функцией непрерывного приближения
+    распределения, без таблицы весов на n элементов. Ранги переводятся
+    в индексы биекцией ``k * step + offset (mod n)``, чтобы популярные
+    объекты не совпадали с первыми id.
+    """
+
+    def __init__(self, rng, n, exponent):
+        self.rng = rng
+        self.n = n
+        self.exponent = exponent
+        self.step = rng.randrange(1, n) if n > 1 else 1
+        while math.gcd(self.step, n) != 1:
+            self.step += 1
+        self.offset = rng.randrange(n)
+
+    def rank(self):
+        u = self.rng.random()
+        if abs(self.exponent - 1) < 1e-9:
+            x = (self.n + 1) ** u
+        else:
+            a = 1 - self.exponent
+            x = (1 + u * ((self.n + 1) ** a - 1)) ** (1 / a)
+        return min(int(x), self.n) - 1
+
+    def sample(self):
+        return (self.rank() * self.step + self.offset) % self.n
+
+    def sample_distinct(self, count, exclude=None):
+        """До ``count`` разных индексов; популярные выпадают чаще."""
+        count = min(count, self.n - (exclude is not None))
+        result = set()
+        for _ in range(count * 20):
+            if len(result) >= count:
+                break
+            index = self.sample()
+            if index != exclude:
+                result.add(index)
+        return result
+
+
+class Command(BaseCommand):
+    help = ('Генерация синтетических данных для нагрузочного тестирования. '
+            'Удаляет существующие рецепты, справочники и пользователей, '
+            'кроме суперпользователей. С одинаковыми --seed и --now '
+            'данные совпадают; id пользователей начинаются после '
+            'наибольшего id оставшихся суперпользователей.')
+
+    # Средние количества на одного пользователя.
+    RECIPES_PER_USER = 1
+    FAVORITES_PER_USER = 5
+    CARTS_PER_USER = 1
+    SUBSCRIPTIONS_PER_USER = 3
+    INGREDIENTS_PER_RECIPE = (3, 12)
+    TAGS_PER_RECIPE = (1, 3)
+    MAX_ACTIVITY = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=int,
+            required=True,
+            help='Количество пользователей. Рецептов столько же, '
+                 'избранного, корзин и подписок — пропорционально.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Начальное значение генератора случайных чисел.'
+        )
+        parser.add_argument(
+            '--now',
+            type=aware_datetime,
+            default=DEFAULT_NOW,
+            help='Точка отсчёта дат публикации и регистрации в формате '
+                 'ISO 8601, по умолчанию 2025-01-01T00:00:00+00:00.'
+        )
+        parser.add_argument(
+            '--zipf',
+            type=float,
+            default=1.1,
+            help='Показатель распределения Ципфа для популярности '
+                 'авторов, рецептов, ингредиентов и тегов.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Количество строк в одном COPY и транзакции.'
+        )
+        parser.add_argument(
+            '--password',
+            default='password',
+            help='Пароль всех создаваемых пользователей.'
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.zipf = options['zipf']
+        self.batch_size = max(options['batch_size'], 1)
+        self.scale = max(options['scale'], 2)
+        self.now = options['now']
+
+        self.stdout.write(self.style.WARNING('Очистка базы данных...'))
+        clear_data()
+        self.tag_ids = self.create_tags()
+        self.ingredient_ids = self.create_ingredients()
+        self.user_ids = self.create_users(options['password'])
+        self.recipe_ids = self.create_recipes()
+        self.create_relations(
+            Favorite, 'recipe_id', self.recipe_ids, self.FAVORITES_PER_USER
+        )
+        self.create_relations(
+            ShoppingCart, 'recipe_id', self.recipe_ids, self.CARTS_PER_USER
+        )
+        self.create_relations(
+            Subscription, 'author_id', self.user_ids,
+            self.SUBSCRIPTIONS_PER_USER
+        )
+
+        self.stdout.write('Пересчёт счётчиков и списков покупок...')
+        with transaction.atomic():
+            reset_sequences(User, Recipe, Ingredient, Tag)
+            refresh_counters()
+            refresh_shopping_lists(self.batch_size)
+        with connection.cursor() as cursor:
+            # Свежая статистика для планировщика и оценок количества.
+            cursor.execute('ANALYZE')
+        reset_caches()
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы.'))
+
+    def sampler(self, ids):
+        return ZipfSampler(self.rng, len(ids), self.zipf)
+
+    def activity(self, mean):
+        """Число действий пользователя: у немногих их намного больше."""
+        return min(
+            int(self.rng.paretovariate(1.5) * mean / 3), self.MAX_ACTIVITY
+        )
+
+    def write(self, progress, model, columns, rows):
+        with transaction.atomic():
+            copy_rows(model, columns, rows)
+        progress.add(len(rows))
+
+    def create_tags(self):
+        tags = Tag.objects.bulk_create([Tag(**data) for data in TAGS])
+        return [tag.pk for tag in tags]
+
+    def create_ingredients(self):
+        count = min(max(self.scale // 10, 100), 20000)
+        progress = Progress(self.stdout, 'Ингредиенты')
+        rows = [
+            (pk, f'{self.rng.choice(INGREDIENT_WORDS)} {pk}',
+             self.rng.choice(UNITS))
+            for pk in range(1, count + 1)
+        ]
+        self.write(progress, Ingredient, ('id', 'name', 'measurement_unit'),
+                   rows)
+        progress.done()
+        return range(1, count + 1)
+
+    def create_users(self, password):
+        progress = Progress(self.stdout, 'Пользователи')
+        # Один хэш на всех: хэширование миллионов паролей заняло бы часы.
+        password = make_password(password)
+        # Суперпользователи не удаляются, их id остаются заняты.
+        first_id = (User.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+        user_ids = range(first_id, first_id + self.scale)
+        columns = (
+            'id', 'password', 'is_superuser', 'username', 'is_staff',
+            'is_active', 'date_joined', 'email', 'first_name', 'last_name',
+            'avatar_variants', 'recipes_count', 'followers_count'
+        )
+        rows = []
+        for number, pk in enumerate(user_ids):
+            joined = self.now - timedelta(
+                seconds=self.rng.randrange(3 * 365 * 24 * 3600)
+            )
+            rows.append((
+                pk, password, False, f'gen_user_{number}', False, True,
+                joined.isoformat(), f'gen_user_{number}@example.com',
+                'Имя', f'Фамилия {number}', '{}', 0, 0
+            ))
+            if len(rows) >= self.batch_size:
+                self.write(progress, User, columns, rows)
+                rows = []
+        if rows:
+            self.write(progress, User, columns, rows)
+        progress.done()
+        return user_ids
+
+    def create_image(self):
+        """Одно изображение и его копии на все рецепты."""
+        storage = Recipe._meta.get_field('image').storage
+        buffer = BytesIO()
+        Image.new('RGB', (1280, 960), '#E26C2D').save(buffer, format='PNG')
+        storage.delete(IMAGE_NAME)
+        name = storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        variants = generate_variants(
+            Recipe(image=name).image, settings.IMAGE_VARIANT_WIDTHS
+        )
+        return name, json.dumps(variants)
+
+    def recipe_text(self):
+        return ' '.join(self.rng.sample(STEPS, self.rng.randint(3, 6)))
+
+    def create_recipes(self):
+        progress = Progress(self.stdout, 'Рецепты')
+        image, variants = self.create_image()
+        authors = self.sampler(self.user_ids)
+        tags = self.sampler(self.tag_ids)
+        ingredients = self.sampler(self.ingredient_ids)
+        recipe_ids = range(1, self.scale * self.RECIPES_PER_USER + 1)
+        columns = (
+            'id', 'author_id', 'name', 'image', 'text', 'cooking_time',
+            'pub_date', 'updated_at', 'image_variants', 'favorites_count',
+            'shopping_carts_count'
+        )
+        rows, tag_rows, ingredient_rows = [], [], []
+        for pk in recipe_ids:
+            published = (self.now - timedelta(
+                seconds=self.rng.randrange(2 * 365 * 24 * 3600)
+            )).isoformat()
+            rows.append((
+                pk, self.user_ids[authors.sample()],
+                f'{self.rng.choice(ADJECTIVES).capitalize()} '
+                f'{self.rng.choice(DISHES)} {self.rng.choice(FILLINGS)}',
+                image, self.recipe_text(), self.rng.randint(5, 180),
+                published, published, variants, 0, 0
+            ))
+            tag_rows.extend(
+                (pk, self.tag_ids[index]) for index in tags.sample_distinct(
+                    self.rng.randint(*self.TAGS_PER_RECIPE)
+                )
+            )
+            ingredient_rows.extend(
+                (pk, self.ingredient_ids[index], self.rng.randint(1, 500))
+                for index in ingredients.sample_distinct(
+                    self.rng.randint(*self.INGREDIENTS_PER_RECIPE)
+                )
+            )
+            if len(rows) >= self.batch_size or pk == recipe_ids[-1]:
+                with transaction.atomic():
+                    copy_rows(Recipe, columns, rows)
+                    copy_rows(
+                        Recipe.tags.through, ('recipe_id', 'tag_id'),
+                        tag_rows
+                    )
+                    copy_rows(
+                        RecipeIngredient,
+                        ('recipe_id', 'ingredient_id', 'amount'),
+                        ingredient_rows
+                    )
+                progress.add(len(rows))
+                rows, tag_rows, ingredient_rows = [], [], []
+        progress.done()
+        return recipe_ids
+
+    def create_relations(self, model, target_column, target_ids, mean):
+        """
+        Связи пользователей с рецептами или авторами.
+
+        Активность пользователей и популярность целей неравномерны:
+        большая часть связей приходится на немногих.
+        """
+        progress = Progress(self.stdout, model._meta.verbose_name_plural)
+        targets = self.sampler(target_ids)
+        columns = ('user_id', target_column)
+        rows = []
+        for user_id in self.user_ids:
+            # Подписка на самого себя запрещена ограничением.
+            exclude = (
+                user_id - self.user_ids[0]
+                if target_ids is self.user_ids else None
+            )
+            rows.extend(
+                (user_id, target_ids[index])
+                for index in targets.sample_distinct(
+                    self.activity(mean), exclude=exclude
+                )
+            )
+            if len(rows) >= self.batch_size:
+                self.write(progress, model, columns, rows)
+                rows = []
+        if rows:
+            self.write(progress, model, columns, rows)
+        progress.done()
@@ -1,97 +1,222 @@
-import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.core.files import File
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
+from recipes.bulk import (Progress, batched, clear_data, iter_json,
+                          reset_caches)
+from recipes.images import generate_variants
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
 from users.models import User
 
 DATA_PATH = Path('/app/data')
 
+TAGS = (
+    {'name': 'завтрак', 'color': '#E26C2D', 'slug': 'breakfast'},
+    {'name': 'обед', 'color': '#49B64E', 'slug': 'lunch'},
+    {'name': 'ужин', 'color': '#8775D2', 'slug': 'dinner'},
+    {'name': 'перекус', 'color': '#3399FF', 'slug': 'snack'},
+    {'name': 'десерт', 'color': '#FF66CC', 'slug': 'dessert'},
+    {'name': 'выпечка', 'color': '#FFCC66', 'slug': 'bakery'},
+)
+
 
 class Command(BaseCommand):
-    help = 'Загрузка тестовых данных из JSON файлов'
+    help = ('Загрузка тестовых данных из JSON файлов. Файлы читаются '
+            'потоком, записи пишутся пачками по --batch-size, пароли '
+            'хэшируются в --workers процессах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--data-path',
+            type=Path,
+            default=DATA_PATH,
+            help='Каталог с users, ingredients и recipes (.json или .jsonl) '
+                 'и изображениями в images/.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество записей в одной пачке и транзакции.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Количество процессов для хэширования паролей.'
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
-        # --- Очистка базы данных ---
+        self.data_path = options['data_path']
+        self.batch_size = max(options['batch_size'], 1)
+        self.workers = max(options['workers'], 1)
+        self.images = {}
+
+        self.clear()
+        pool = (
+            ProcessPoolExecutor(self.workers, initializer=django.setup)
+            if self.workers > 1 else nullcontext()
+        )
+        with pool:
+            author_ids = self.load_users(pool)
+        tag_ids = self.load_tags()
+        ingredient_ids = self.load_ingredients()
+        self.load_recipes(author_ids, tag_ids, ingredient_ids)
+
+        reset_caches()
+        self.stdout.write(self.style.SUCCESS('Все данные успешно загружены!'))
+
+    def data_file(self, name):
+        for suffix in ('.jsonl', '.json'):
+            path = self.data_path / f'{name}{suffix}'
+            if path.exists():
+                return path
+        raise CommandError(f'Не найден файл {name}.json в {self.data_path}.')
+
+    def clear(self):
         self.stdout.write(self.style.WARNING('Начало очистки базы данных...'))
-        User.objects.filter(is_superuser=False).delete()
-        Recipe.objects.all().delete()
-        Tag.objects.all().delete()
-        Ingredient.objects.all().delete()
+        clear_data()
         self.stdout.write(self.style.SUCCESS('База данных очищена.'))
 
-        # --- Создание пользователей ---
-        self.stdout.write('Создание пользователей...')
-        with open(DATA_PATH / 'users.json', 'r', encoding='utf-8') as f:
-            users_data = json.load(f)
-        for user_data in users_data:
-            User.objects.create_user(**user_data)
-        self.stdout.write(self.style.SUCCESS('Пользователи созданы.'))
-
-        # --- Создание тегов ---
-        self.stdout.write('Создание тегов...')
-        tags_data = [
-            {'name': 'завтрак', 'color': '#E26C2D', 'slug': 'breakfast'},
-            {'name': 'обед', 'color': '#49B64E', 'slug': 'lunch'},
-            {'name': 'ужин', 'color': '#8775D2', 'slug': 'dinner'},
-            {'name': 'перекус', 'color': '#3399FF', 'slug': 'snack'},
-            {'name': 'десерт', 'color': '#FF66CC', 'slug': 'dessert'},
-            {'name': 'выпечка', 'color': '#FFCC66', 'slug': 'bakery'},
-        ]
-        Tag.objects.bulk_create([Tag(**data) for data in tags_data])
+    def hash_passwords(self, pool, passwords):
+        if not isinstance(pool, ProcessPoolExecutor):
+            return [make_password(password) for password in passwords]
+        return list(pool.map(
+            make_password, passwords,
+            chunksize=max(len(passwords) // (self.workers * 4), 1)
+        ))
+
+    def load_users(self, pool):
+        progress = Progress(self.stdout, 'Пользователи')
+        # Рецепты могут принадлежать и оставшимся суперпользователям.
+        author_ids = dict(User.objects.values_list('username', 'pk'))
+        for batch in batched(iter_json(self.data_file('users')),
+                             self.batch_size):
+            passwords = self.hash_passwords(
+                pool, [data.pop('password', None) for data in batch]
+            )
+            users = [
+                User(**{
+                    **data,
+                    'username': User.normalize_username(data['username']),
+                    'email': User.objects.normalize_email(data['email']),
+                    'password': password,
+                })
+                for data, password in zip(batch, passwords)
+            ]
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+            author_ids.update((user.username, user.pk) for user in users)
+            progress.add(len(users))
+        progress.done()
+        return author_ids
+
+    def load_tags(self):
+        tags = Tag.objects.bulk_create([Tag(**data) for data in TAGS])
         self.stdout.write(self.style.SUCCESS('Теги созданы.'))
-
-        # --- Загрузка ингредиентов ---
-        self.stdout.write('Загрузка ингредиентов...')
-        with open(DATA_PATH / 'ingredients.json', 'r', encoding='utf-8') as f:
-            ingredients_data = json.load(f)
-        Ingredient.objects.bulk_create(
-            [Ingredient(**data) for data in ingredients_data]
-        )
-        self.stdout.write(self.style.SUCCESS('Ингредиенты загружены.'))
-
-        # --- Загрузка рецептов ---
-        self.stdout.write('Загрузка рецептов...')
-        with open(DATA_PATH / 'recipes.json', 'r', encoding='utf-8') as f:
-            recipes_data = json.load(f)
-
-        for recipe_data in recipes_data:
-            author = User.objects.get(username=recipe_data['author_username'])
-            tags = Tag.objects.filter(name__in=recipe_data['tags'])
-            ingredients_data = recipe_data.pop('ingredients')
-
-            recipe = Recipe.objects.create(
-                author=author,
-                name=recipe_data['name'],
-                text=recipe_data['text'],
-                cooking_time=recipe_data['cooking_time']
+        return {tag.name: tag.pk for tag in tags}
+
+    def load_ingredients(self):
+        progress = Progress(self.stdout, 'Ингредиенты')
+        ingredient_ids = {}
+        for batch in batched(iter_json(self.data_file('ingredients')),
+                             self.batch_size):
+            with transaction.atomic():
+                ingredients = Ingredient.objects.bulk_create(
+                    [Ingredient(**data) for data in batch]
+                )
+            ingredient_ids.update(
+                ((ingredient.name, ingredient.measurement_unit),
+                 ingredient.pk)
+                for ingredient in ingredients
             )
-
-            image_path = DATA_PATH / 'images' / recipe_data['image']
-            with open(image_path, 'rb') as img_file:
-                recipe.image.save(
-                    recipe_data['image'], File(img_file), save=True
+            progress.add(len(ingredients))
+        progress.done()
+        return ingredient_ids
+
+    def store_image(self, name):
+        """
+        Сохраняет изображение в хранилище один раз на исходный файл.
+
+        Рецепты с одинаковым исходным изображением ссылаются на один
+        файл и общий набор уменьшенных копий.
+        """
+        if name not in self.images:
+            field = Recipe._meta.get_field('image')
+            with open(self.data_path / 'images' / name, 'rb') as file:
+                stored_name = field.storage.save(
+                    field.generate_filename(None, name), File(file)
                 )
-
-            recipe.tags.set(tags)
-
-            recipe_ingredients = []
-            for ing_data in ingredients_data:
-                ingredient = Ingredient.objects.get(
-                    name=ing_data['name'],
-                    measurement_unit=ing_data['measurement_unit']
+            recipe = Recipe(image=stored_name)
+            try:
+                variants = generate_variants(
+                    recipe.image, settings.IMAGE_VARIANT_WIDTHS
                 )
-                recipe_ingredients.append(
-                    RecipeIngredient(
-                        recipe=recipe,
-                        ingredient=ingredient,
-                        amount=ing_data['amount']
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'Копии {name} не созданы: {error}')
+                variants = {}
+            self.images[name] = stored_name, variants
+        return self.images[name]
+
+    def load_recipes(self, author_ids, tag_ids, ingredient_ids):
+        progress = Progress(self.stdout, 'Рецепты')
+        recipes_count = Counter()
+        RecipeTag = Recipe.tags.through
+        for batch in batched(iter_json(self.data_file('recipes')),
+                             self.batch_size):
+            recipes = []
+            for data in batch:
+                image, variants = self.store_image(data['image'])
+                try:
+                    author_id = author_ids[data['author_username']]
+                except KeyError:
+                    raise CommandError(
+                        f'Рецепт «{data["name"]}»: неизвестный автор '
+                        f'{data["author_username"]}.'
                     )
+                recipes.append(Recipe(
+                    author_id=author_id, name=data['name'],
+                    text=data['text'], cooking_time=data['cooking_time'],
+                    image=image, image_variants=variants
+                ))
+                recipes_count[author_id] += 1
+            with transaction.atomic():
+                Recipe.objects.bulk_create(recipes)
+                RecipeTag.objects.bulk_create(
+                    RecipeTag(recipe_id=recipe.pk, tag_id=tag_ids[tag])
+                    for recipe, data in zip(recipes, batch)
+                    for tag in data['tags'] if tag in tag_ids
                 )
-            RecipeIngredient.objects.bulk_create(recipe_ingredients)
+                RecipeIngredient.objects.bulk_create(
+                    self.recipe_ingredients(recipes, batch, ingredient_ids)
+                )
+            progress.add(len(recipes))
+        progress.done()
+        User.objects.bulk_update(
+            [User(pk=pk, recipes_count=count)
+             for pk, count in recipes_count.items()],
+            ('recipes_count',), batch_size=self.batch_size
+        )
 
-        self.stdout.write(self.style.SUCCESS('Все данные успешно загружены!'))
+    def recipe_ingredients(self, recipes, batch, ingredient_ids):
+        for recipe, data in zip(recipes, batch):
+            for item in data['ingredients']:
+                key = item['name'], item['measurement_unit']
+                if key not in ingredient_ids:
+                    raise CommandError(
+                        f'Рецепт «{recipe.name}»: неизвестный ингредиент '
+                        f'{key[0]}, {key[1]}.'
+                    )
+                yield RecipeIngredient(
+                    recipe_id=recipe.pk, ingredient_id=ingredient_ids[key],
+                    amount=item['amount']
+                )
@@ -4,6 +4,7 @@ from pathlib import Path
 from django.core.management.base import BaseCommand
 from django.db import transaction
 
+from recipes.bulk import reset_caches
 from recipes.models import Ingredient, Recipe, Tag
 from users.models import User
 
@@ -46,4 +47,7 @@ class Command(BaseCommand):
         )
         self.stdout.write(self.style.SUCCESS('Ингредиенты загружены.'))
 
+        # bulk_create не вызывает сигналы, поэтому кэши сбрасываются явно.
+        transaction.on_commit(reset_caches)
+
         self.stdout.write(self.style.SUCCESS('Все данные успешно загружены!'))
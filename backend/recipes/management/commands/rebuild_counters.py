@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from recipes.bulk import live_count
+from recipes.signals import COUNTERS
+
+
+class Command(BaseCommand):
+    help = ('Сверка и пересчёт денормализованных счётчиков избранного, '
+            'корзин, рецептов и подписчиков')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счётчики, ничего не меняя.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при записи исправленных счётчиков.'
+        )
+
+    def handle(self, *args, **options):
+        mismatches = 0
+        for related_model, (model, attname, field) in COUNTERS.items():
+            with transaction.atomic():
+                mismatches += self.process(
+                    related_model, model, attname, field, options
+                )
+        if mismatches and options['check']:
+            raise CommandError(f'Расхождений в счётчиках: {mismatches}.')
+        if mismatches:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено счётчиков: {mismatches}.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                'Счётчики совпадают с данными.'
+            ))
+
+    def process(self, related_model, model, attname, field, options):
+        label = f'{model._meta.model_name}.{field}'
+        drifted = model.objects.annotate(
+            actual=live_count(related_model, attname)
+        ).exclude(**{field: F('actual')}).only('pk', field)
+        if not options['check']:
+            drifted = drifted.select_for_update(of=('self',))
+        fixed = []
+        for obj in drifted.iterator(chunk_size=options['batch_size']):
+            self.stdout.write(self.style.WARNING(
+                f'{label}, id={obj.pk}: {getattr(obj, field)}, '
+                f'ожидалось {obj.actual}'
+            ))
+            setattr(obj, field, obj.actual)
+            fixed.append(obj)
+        if fixed and not options['check']:
+            model.objects.bulk_update(
+                fixed, (field,), batch_size=options['batch_size']
+            )
+        return len(fixed)
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.bulk import refresh_shopping_lists
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт сумм ингредиентов в списках покупок и сверка '
+            'с корзинами пользователей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить суммы, ничего не меняя.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при записи строк.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            self.rebuild(options['batch_size'])
+        mismatches = self.verify()
+        if mismatches:
+            raise CommandError(
+                f'Расхождений со списками покупок: {mismatches}.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Списки покупок совпадают с корзинами.'
+        ))
+
+    @transaction.atomic
+    def rebuild(self, batch_size):
+        self.stdout.write('Пересчёт списков покупок...')
+        refresh_shopping_lists(batch_size)
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересчитаны.'))
+
+    def verify(self):
+        self.stdout.write('Сверка списков покупок...')
+        expected = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingListItem.objects.live_totals().iterator()
+        }
+        mismatches = 0
+        for user_id, ingredient_id, amount in (
+            ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            ).iterator()
+        ):
+            if expected.pop((user_id, ingredient_id), None) != amount:
+                mismatches += 1
+                self.stdout.write(self.style.WARNING(
+                    f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                    f'в списке {amount}'
+                ))
+        for (user_id, ingredient_id), amount in expected.items():
+            mismatches += 1
+            self.stdout.write(self.style.WARNING(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'нет в списке, ожидалось {amount}'
+            ))
+        return mismatches
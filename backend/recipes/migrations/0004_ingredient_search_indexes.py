@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:24
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shoppinglistitem'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['name'],
+                name='ingredient_name_trgm_idx',
+                opclasses=['gin_trgm_ops']
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper('name'),
+                    name='text_pattern_ops'
+                ),
+                include=('id', 'name', 'measurement_unit'),
+                name='ingredient_name_prefix_idx'
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:26
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.contrib.postgres.search.CombinedSearchVector(
+                    django.contrib.postgres.search.SearchVector(
+                        'name', config='russian', weight='A'
+                    ),
+                    '||',
+                    django.contrib.postgres.search.SearchVector(
+                        'text', config='russian', weight='B'
+                    ),
+                    django.contrib.postgres.search.SearchConfig('russian')
+                ),
+                output_field=django.contrib.postgres.search
+                .SearchVectorField(),
+                verbose_name='Поисковый вектор'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['search_vector'], name='recipe_search_vector_idx'
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(
+                blank=True, default=dict, editable=False,
+                verbose_name='Уменьшенные копии изображения'
+            ),
+        ),
+    ]
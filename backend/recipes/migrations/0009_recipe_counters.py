@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:41
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favorite', 'recipe'),
+    ('recipes.Recipe', 'shopping_carts_count', 'recipes.ShoppingCart',
+     'recipe'),
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.User', 'followers_count', 'users.Subscription', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for model_name, field, related_name, fk in COUNTERS:
+        total = apps.get_model(related_name).objects.filter(
+            **{fk: models.OuterRef('pk')}
+        ).order_by().values(fk).annotate(
+            total=models.Count('pk')
+        ).values('total')
+        apps.get_model(model_name).objects.update(**{
+            field: Coalesce(models.Subquery(total), models.Value(0))
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_image_variants'),
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name='В избранном'
+            ),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_carts_count',
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name='В списках покупок'
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,42 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField,
+                                            TrigramSimilarity,
+                                            TrigramWordSimilarity)
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import (Case, Exists, F, OuterRef, Prefetch, Q, Sum,
+                              Value, When)
+from django.db.models.functions import Greatest, Upper
 
-from users.models import User
+from users.models import CountersMixin, Subscription, User
+
+
+class IngredientQuerySet(models.QuerySet):
+    """Набор запросов для ингредиентов."""
+
+    def fuzzy_search(self, name):
+        """
+        Ищет ингредиенты по началу названия и по похожести (pg_trgm).
+
+        Сначала идут совпадения по началу названия, затем остальные
+        в порядке убывания похожести на всё название или на одно
+        из его слов.
+        """
+        return self.filter(
+            Q(name__istartswith=name)
+            | Q(name__trigram_similar=name)
+            | Q(name__trigram_word_similar=name)
+        ).annotate(
+            is_prefix=Case(
+                When(name__istartswith=name, then=Value(True)),
+                default=Value(False)
+            ),
+            similarity=Greatest(
+                TrigramSimilarity('name', name),
+                TrigramWordSimilarity(name, 'name')
+            )
+        ).order_by('-is_prefix', '-similarity', 'name', 'measurement_unit')
 
 
 class Ingredient(models.Model):
@@ -15,6 +50,8 @@ class Ingredient(models.Model):
         max_length=200
     )
 
+    objects = IngredientQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
@@ -23,6 +60,15 @@ class Ingredient(models.Model):
             models.UniqueConstraint(fields=['name', 'measurement_unit'],
                                     name='unique_ingredient_unit')
         ]
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'],
+                     name='ingredient_name_trgm_idx'),
+            # Для name__istartswith: UPPER(name) LIKE 'X%' читается
+            # только из индекса.
+            models.Index(OpClass(Upper('name'), name='text_pattern_ops'),
+                         include=['id', 'name', 'measurement_unit'],
+                         name='ingredient_name_prefix_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -55,7 +101,75 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+SEARCH_CONFIG = 'russian'
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов для рецептов."""
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует рецепты флагами избранного и списка покупок,
+        чтобы сериализатор не делал отдельный запрос на каждый рецепт.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False)
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        )
+
+    def with_related(self, user):
+        """
+        Подгружает авторов и ингредиенты фиксированным числом запросов
+        независимо от количества рецептов.
+        """
+        authors = User.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, author=OuterRef('pk')
+                )
+            ))
+        return self.prefetch_related(
+            Prefetch('author', queryset=authors),
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+
+    def for_user(self, user):
+        """Готовит рецепты к сериализации для указанного пользователя."""
+        return self.defer('search_vector').with_user_flags(
+            user
+        ).with_related(user)
+
+    def search(self, text):
+        """
+        Полнотекстовый поиск по названию и описанию рецепта.
+
+        Результаты упорядочены по релевантности: совпадения в названии
+        весят больше, чем в описании.
+        """
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return self.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date')
+
+
+class Recipe(CountersMixin, models.Model):
     """Модель рецепта."""
     author = models.ForeignKey(
         User,
@@ -95,15 +209,63 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    image_variants = models.JSONField(
+        'Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    favorites_count = models.IntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    shopping_carts_count = models.IntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False
+    )
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        verbose_name='Поисковый вектор'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ('favorites_count', 'shopping_carts_count')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            GinIndex(fields=['search_vector'],
+                     name='recipe_search_vector_idx'),
+            # Поиск части названия в админке: UPPER(name) LIKE UPPER(...).
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'),
+                     name='recipe_name_trgm_idx'),
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def get_ingredient_amounts(self):
+        """Возвращает количества ингредиентов: {ingredient_id: amount}."""
+        return dict(self.recipe_ingredients.values_list(
+            'ingredient_id', 'amount'
+        ))
+
 
 class RecipeIngredient(models.Model):
     """Промежуточная модель для связи рецептов и ингредиентов."""
@@ -176,3 +338,131 @@ class ShoppingCart(AbstractUserRecipe):
         default_related_name = 'shopping_cart'
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+
+
+def _negate_amounts(amounts):
+    return {
+        ingredient_id: -amount for ingredient_id, amount in amounts.items()
+    }
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    """Набор запросов для сумм ингредиентов в списках покупок."""
+
+    def apply_deltas(self, user_ids, deltas):
+        """
+        Прибавляет ``deltas`` ({ingredient_id: amount}) к спискам покупок
+        пользователей ``user_ids``. Отрицательные значения уменьшают
+        сумму, строки с нулевой суммой удаляются.
+        """
+        user_ids = list(user_ids)
+        deltas = {
+            ingredient_id: amount
+            for ingredient_id, amount in deltas.items() if amount
+        }
+        if not user_ids or not deltas:
+            return
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=0)
+                for user_id in user_ids
+                for ingredient_id, amount in deltas.items() if amount > 0
+            ],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+        items = self.filter(user_id__in=user_ids, ingredient_id__in=deltas)
+        items.update(amount=F('amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(amount))
+              for ingredient_id, amount in deltas.items()),
+            default=Value(0)
+        ))
+        items.filter(amount__lte=0).delete()
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        """
+        Добавляет ингредиенты рецепта в список покупок пользователя,
+        при ``sign=-1`` вычитает их.
+        """
+        amounts = RecipeIngredient.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', 'amount')
+        self.apply_deltas(
+            [user_id],
+            {ingredient_id: sign * amount
+             for ingredient_id, amount in amounts}
+        )
+
+    def add_to_carts(self, recipe_id, deltas):
+        """Прибавляет ``deltas`` ко всем, у кого рецепт в корзине."""
+        self.apply_deltas(
+            ShoppingCart.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('user_id', flat=True),
+            deltas
+        )
+
+    def remove_recipe_from_carts(self, recipe):
+        """Вычитает ингредиенты рецепта у всех, у кого он в корзине."""
+        self.apply_deltas(
+            recipe.shopping_cart.values_list('user_id', flat=True),
+            _negate_amounts(recipe.get_ingredient_amounts())
+        )
+
+    def update_recipe(self, recipe, old_amounts):
+        """
+        Переносит изменение состава рецепта в списки покупок всех,
+        у кого он в корзине. ``old_amounts`` — состав до изменения.
+        """
+        deltas = _negate_amounts(old_amounts)
+        for ingredient_id, amount in recipe.get_ingredient_amounts().items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) + amount
+        self.apply_deltas(
+            recipe.shopping_cart.values_list('user_id', flat=True), deltas
+        )
+
+    def live_totals(self):
+        """Считает суммы ингредиентов по корзинам напрямую из рецептов."""
+        return RecipeIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values(
+            'ingredient_id', user_id=F('recipe__shopping_cart__user')
+        ).annotate(
+            total_amount=Sum('amount')
+        ).values_list('user_id', 'ingredient_id', 'total_amount')
+
+
+class ShoppingListItem(models.Model):
+    """
+    Сумма ингредиента в списке покупок пользователя.
+
+    Поддерживается инкрементально при изменении корзины и состава
+    рецептов, поэтому выгрузка списка покупок читает готовые суммы.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField('Количество')
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} — {self.amount} ({self.user})'
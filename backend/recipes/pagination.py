@@ -1,6 +1,308 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import hashlib
+import json
+import re
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import (EmptyPage, Page, PageNotAnInteger,
+                                   Paginator)
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from monitoring.metrics import cache_requests
+
+COUNTS_VERSION_KEY = 'pagination:counts:version'
+# Таблицы в тексте SQL, включая подзапросы: FROM "..." и JOIN "...".
+TABLE_NAME = re.compile(r'\b(?:FROM|JOIN)\s+"([^"]+)"')
+
+
+def get_counts_version(tables=()):
+    """
+    Возвращает версию закэшированных количеств для запроса к tables.
+
+    Версия складывается из общей версии и версий каждой таблицы,
+    поэтому запись в одну таблицу не сбрасывает количества остальных.
+    """
+    keys = [
+        COUNTS_VERSION_KEY,
+        *(f'{COUNTS_VERSION_KEY}:{table}' for table in sorted(tables))
+    ]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+    return ':'.join(map(str, (versions[key] for key in keys)))
+
+
+def bump_counts_version(*models):
+    """
+    Сбрасывает закэшированные количества запросов к таблицам моделей.
+
+    Без аргументов сбрасывает все количества.
+    """
+    keys = [
+        f'{COUNTS_VERSION_KEY}:{model._meta.db_table}' for model in models
+    ] or [COUNTS_VERSION_KEY]
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+class EstimatedPage(Page):
+    """
+    Страница списка с приблизительным количеством записей.
+
+    Следующая страница определяется не по количеству, а по лишней
+    выбранной строке.
+    """
+
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator с кэшированным и приблизительным подсчётом записей.
+
+    Точное количество кэшируется по тексту SQL-запроса, то есть по
+    набору фильтров, на ``PAGINATION_COUNT_CACHE_TIMEOUT`` секунд.
+    Подсчёт ограничен ``PAGINATION_EXACT_COUNT_LIMIT`` строками:
+    если записей больше, берётся оценка планировщика из ``EXPLAIN``.
+    Признак точности хранится в ``count_is_exact``. Оценка только
+    показывается клиенту: планировщик может её занизить, поэтому
+    номер страницы с ней не сверяется, а несуществующей считается
+    пустая страница.
+    """
+
+    def get_cache_key(self):
+        try:
+            sql, params = self.object_list.query.sql_with_params()
+        except EmptyResultSet:
+            return None
+        version = get_counts_version(set(TABLE_NAME.findall(sql)))
+        digest = hashlib.md5(
+            f'{version}{sql}{params!r}'.encode(), usedforsecurity=False
+        ).hexdigest()
+        return f'pagination:count:{digest}'
+
+    def estimate_count(self, queryset):
+        plan = json.loads(queryset.explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def compute_count(self):
+        limit = settings.PAGINATION_EXACT_COUNT_LIMIT
+        queryset = self.object_list.order_by()
+        count = queryset[:limit + 1].count()
+        if count <= limit:
+            return count, True
+        return max(self.estimate_count(queryset), count), False
+
+    @cached_property
+    def count_info(self):
+        if not hasattr(self.object_list, 'query'):
+            return len(self.object_list), True
+        key = self.get_cache_key()
+        if key is None:
+            return 0, True
+        info = cache.get(key)
+        cache_requests.inc(
+            cache='pagination_count',
+            result='miss' if info is None else 'hit'
+        )
+        if info is None:
+            info = self.compute_count()
+            cache.set(
+                key, info, timeout=settings.PAGINATION_COUNT_CACHE_TIMEOUT
+            )
+        return info
+
+    @cached_property
+    def count(self):
+        return self.count_info[0]
+
+    @property
+    def count_is_exact(self):
+        return self.count_info[1]
+
+    def validate_number(self, number):
+        if self.count_is_exact:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        if self.count_is_exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(
+            self.object_list[bottom:bottom + self.per_page + 1]
+        )
+        if not object_list and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return EstimatedPage(
+            object_list[:self.per_page], number, self,
+            has_more=len(object_list) > self.per_page
+        )
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     max_page_size = 100
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_is_exact'] = self.page.paginator.count_is_exact
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count_is_exact'] = {
+            'type': 'boolean',
+            'example': True,
+        }
+        return schema
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по ключу (keyset).
+
+    Следующая страница начинается сразу после последней записи текущей:
+    ``WHERE (pub_date, id) < (:pub_date, :id) ORDER BY pub_date DESC,
+    id DESC LIMIT :limit``. Запрос не использует OFFSET и COUNT(*),
+    поэтому стоимость страницы не зависит от её номера. Последнее поле
+    ``ordering`` должно быть уникальным. Курсор непрозрачен для клиента
+    и позволяет двигаться только вперёд.
+    """
+    ordering = ('-pub_date', '-id')
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, page_size, ordering=None):
+        self.page_size = page_size
+        if ordering is not None:
+            self.ordering = ordering
+
+    def encode_cursor(self, instance):
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            position.append(value)
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode()
+        ).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+            len(position) != len(self.ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def filter_after(self, queryset, position):
+        """Оставляет записи, которые идут после позиции курсора."""
+        fields = [
+            (field.lstrip('-'), 'lt' if field.startswith('-') else 'gt')
+            for field in self.ordering
+        ]
+        condition = Q()
+        for index, (name, lookup) in enumerate(fields):
+            previous = {
+                field_name: value
+                for (field_name, _), value in zip(fields[:index], position)
+            }
+            previous[f'{name}__{lookup}'] = position[index]
+            condition |= Q(**previous)
+        # Граница по первому полю позволяет читать индекс как диапазон.
+        first_name, first_lookup = fields[0]
+        return queryset.filter(
+            **{f'{first_name}__{first_lookup}e': position[0]}
+        ).filter(condition)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                queryset = self.filter_after(
+                    queryset, self.decode_cursor(cursor)
+                )
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+
+class FeedPagination(LimitPageNumberPagination):
+    """
+    Постраничная пагинация с опциональным режимом keyset.
+
+    По умолчанию работает как LimitPageNumberPagination. Если в запросе
+    есть параметр ``cursor`` (для первой страницы — пустой), страницы
+    отдаются через KeysetPagination без подсчёта общего количества.
+    """
+    keyset_ordering = KeysetPagination.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.keyset = KeysetPagination(
+            self.get_page_size(request), self.keyset_ordering
+        )
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class SubscriptionPagination(FeedPagination):
+    """Пагинация подписок: в режиме keyset — по имени пользователя."""
+    keyset_ordering = ('username',)
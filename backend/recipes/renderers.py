@@ -0,0 +1,77 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+from itertools import islice
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingListRendererMixin(ABC):
+    """
+    Потоковая выгрузка списка покупок.
+
+    Принимает строки вида ``(name, measurement_unit, amount)``.
+    Строки склеиваются в блоки по ``chunk_size``, чтобы не отправлять
+    клиенту отдельный фрагмент на каждый ингредиент. Формат строк
+    задаёт ``iter_lines`` рендерера.
+    """
+    chunk_size = 500
+
+    def stream(self, items):
+        lines = self.iter_lines(items)
+        while True:
+            chunk = ''.join(islice(lines, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk.encode('utf-8')
+
+    @abstractmethod
+    def iter_lines(self, items):
+        """Строки файла для ``(name, measurement_unit, amount)``."""
+
+
+class ShoppingListTextRenderer(ShoppingListRendererMixin, BaseRenderer):
+    """Список покупок в виде текстового файла."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def iter_lines(self, items):
+        yield 'Список покупок:\n\n'
+        for name, measurement_unit, amount in items:
+            yield f'- {name} ({measurement_unit}) — {amount}\n'
+
+
+class ShoppingListCSVRenderer(ShoppingListTextRenderer):
+    """Список покупок в формате CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    class _Line:
+        """Буфер, который возвращает строку CSV вместо записи в файл."""
+        def write(self, value):
+            return value
+
+    def iter_lines(self, items):
+        writer = csv.writer(self._Line())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for item in items:
+            yield writer.writerow(item)
+
+
+class ShoppingListJSONRenderer(ShoppingListRendererMixin, JSONRenderer):
+    """Список покупок в формате JSON."""
+
+    def iter_lines(self, items):
+        separator = '['
+        for name, measurement_unit, amount in items:
+            yield separator + json.dumps({
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            }, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
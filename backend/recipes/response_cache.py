@@ -0,0 +1,182 @@
+import hashlib
+import time
+import uuid
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from monitoring.metrics import cache_requests
+
+RESPONSE_CACHE_PREFIX = 'recipes:response'
+
+
+class ResponseCache:
+    """
+    Кэш ответов для анонимных пользователей.
+
+    Запись хранит данные ответа и версии тегов, от которых она зависит,
+    например ``recipes`` или ``user:<id>``. Чтобы сбросить все записи
+    с тегом, достаточно удалить его версию: при чтении версии не совпадут.
+    Пересчёт одной записи выполняет только один запрос, остальные ждут
+    его результата (single-flight). Попадания и промахи считаются в кэше.
+    """
+    cacheable_params = frozenset(('page', 'limit', 'tags', 'author'))
+    lock_timeout = 10
+    wait_interval = 0.05
+    wait_attempts = 20
+
+    def __init__(self, prefix=RESPONSE_CACHE_PREFIX):
+        self.prefix = prefix
+
+    def tag_key(self, tag):
+        return f'{self.prefix}:tag:{tag}'
+
+    def stats_key(self, name):
+        return f'{self.prefix}:stats:{name}'
+
+    def is_cacheable(self, request):
+        return (
+            request.method == 'GET'
+            and not request.user.is_authenticated
+            and set(request.query_params) <= self.cacheable_params
+        )
+
+    def make_key(self, request, name):
+        """Ключ по нормализованной строке запроса."""
+        params = []
+        for param in sorted(request.query_params):
+            values = sorted({
+                value for value in request.query_params.getlist(param)
+                if value
+            })
+            if param == 'page' and values == ['1']:
+                continue
+            params.extend((param, value) for value in values)
+        query = urlencode(params)
+        digest = hashlib.md5(
+            f'{request.get_host()}?{query}'.encode(), usedforsecurity=False
+        ).hexdigest()
+        return f'{self.prefix}:{name}:{digest}'
+
+    def make_version(self, changed_at=0):
+        """Версия тега: время сброса и случайная часть."""
+        return f'{changed_at!r}:{uuid.uuid4().hex}'
+
+    def changed_at(self, version):
+        """Время сброса тега; 0, если тег не сбрасывался."""
+        try:
+            return float(version.partition(':')[0])
+        except (AttributeError, ValueError):
+            return 0
+
+    def get_versions(self, tags):
+        """Возвращает текущие версии тегов, создавая недостающие."""
+        keys = {self.tag_key(tag): tag for tag in tags}
+        versions = cache.get_many(keys)
+        for key in keys.keys() - versions.keys():
+            cache.add(key, self.make_version(), timeout=None)
+            versions[key] = cache.get(key)
+        return {keys[key]: version for key, version in versions.items()}
+
+    def invalidate(self, *tags):
+        """
+        Сбрасывает все записи, зависящие от указанных тегов.
+
+        Тег получает новую версию с временем сброса, по которому
+        compute() узнаёт о сбросе во время вычисления ответа.
+        """
+        now = time.time()
+        cache.set_many(
+            {self.tag_key(tag): self.make_version(now) for tag in tags},
+            timeout=None
+        )
+
+    def get(self, key):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        data, versions = entry
+        if self.get_versions(versions) != versions:
+            return None
+        return data
+
+    def set(self, key, data, versions):
+        cache.set(
+            key, (data, versions),
+            timeout=settings.RESPONSE_CACHE_TIMEOUT
+        )
+
+    def count(self, name):
+        cache_requests.inc(
+            cache='response', result='hit' if name == 'hits' else 'miss'
+        )
+        key = self.stats_key(name)
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+    def stats(self):
+        """Счётчики попаданий и промахов."""
+        return {
+            name: cache.get(self.stats_key(name), 0)
+            for name in ('hits', 'misses')
+        }
+
+    def respond(self, request, name, tags, compute, get_tags=None):
+        """
+        Отдаёт ответ из кэша или вычисляет его через compute().
+
+        tags — теги, известные до вычисления; get_tags(data) возвращает
+        теги, которые зависят от содержимого ответа, например авторов.
+        """
+        key = self.make_key(request, name)
+        for _ in range(self.wait_attempts):
+            data = self.get(key)
+            if data is not None:
+                self.count('hits')
+                return self.make_response(data, 'HIT')
+            if cache.add(f'{key}:lock', 1, timeout=self.lock_timeout):
+                try:
+                    return self.compute(key, tags, compute, get_tags)
+                finally:
+                    cache.delete(f'{key}:lock')
+            time.sleep(self.wait_interval)
+        # Не дождались чужого пересчёта — считаем сами без записи в кэш.
+        self.count('misses')
+        return compute()
+
+    def compute(self, key, tags, compute, get_tags):
+        self.count('misses')
+        # Версии известных тегов берутся до вычисления: изменения во
+        # время него сделают запись устаревшей.
+        started = time.time()
+        versions = self.get_versions(tags)
+        response = compute()
+        if response.status_code == 200:
+            if get_tags is not None:
+                # Теги из содержимого ответа известны только после
+                # вычисления. Если какой-то из них сбросили уже после
+                # его начала, данные могли устареть: не кэшируем.
+                content_versions = self.get_versions(
+                    get_tags(response.data)
+                )
+                if any(self.changed_at(version) >= started
+                       for version in content_versions.values()):
+                    response['X-Cache'] = 'MISS'
+                    return response
+                versions.update(content_versions)
+            self.set(key, response.data, versions)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def make_response(self, data, status):
+        response = Response(data)
+        response['X-Cache'] = status
+        return response
+
+
+response_cache = ResponseCache()
@@ -1,9 +1,12 @@
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 
-from .fields import Base64ImageField
+from .catalog import ingredient_catalog, tag_catalog
+from .fields import (Base64ImageField, CatalogPrimaryKeyRelatedField,
+                     ImageSrcsetField)
 from .models import (Ingredient, Recipe, RecipeIngredient,
-                     Tag, Favorite, ShoppingCart)
+                     Tag, Favorite, ShoppingCart, ShoppingListItem)
+from .signals import shopping_lists_detached
 from users.serializers import CustomUserSerializer
 
 
@@ -44,31 +47,43 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image_srcset = ImageSrcsetField('image')
 
     class Meta:
         model = Recipe
         fields = ('id', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
-
-    def get_is_favorited(self, obj):
+                  'is_in_shopping_cart', 'name', 'image', 'image_srcset',
+                  'text', 'cooking_time', 'favorites_count',
+                  'shopping_carts_count')
+
+    def _get_relation_flag(self, obj, name, model):
+        """
+        Возвращает флаг связи пользователя с рецептом.
+
+        Берёт аннотацию из queryset, а если её нет (например, рецепт
+        только что создан), делает запрос к базе.
+        """
+        flag = getattr(obj, name, None)
+        if flag is not None:
+            return flag
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return Favorite.objects.filter(
+            return model.objects.filter(
                 user=request.user, recipe=obj).exists()
         return False
 
+    def get_is_favorited(self, obj):
+        return self._get_relation_flag(obj, 'is_favorited', Favorite)
+
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return ShoppingCart.objects.filter(
-                user=request.user, recipe=obj).exists()
-        return False
+        return self._get_relation_flag(
+            obj, 'is_in_shopping_cart', ShoppingCart
+        )
 
 
 class AddIngredientToRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для добавления ингредиента в рецепт при создании."""
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = CatalogPrimaryKeyRelatedField(catalog=ingredient_catalog)
     amount = serializers.IntegerField()
 
     class Meta:
@@ -85,8 +100,8 @@ class AddIngredientToRecipeSerializer(serializers.ModelSerializer):
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и обновления рецептов."""
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True, required=False
+    tags = CatalogPrimaryKeyRelatedField(
+        catalog=tag_catalog, many=True, required=False
     )
     ingredients = AddIngredientToRecipeSerializer(many=True)
     image = Base64ImageField(allow_null=True, required=False)
@@ -122,6 +137,18 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
 
         return data
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        except IntegrityError:
+            # Справочник процесса мог устареть: ингредиент или тег
+            # удалили, а версия справочника ещё не дошла до процесса.
+            ingredient_catalog.reset()
+            tag_catalog.reset()
+            raise serializers.ValidationError(
+                'Ингредиент или тег не найден, обновите страницу.'
+            )
+
     def create_ingredients(self, recipe, ingredients_data):
         RecipeIngredient.objects.bulk_create([
             RecipeIngredient(
@@ -161,10 +188,18 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             instance.tags.set(tags_data)
 
         if ingredients_data is not None:
-            instance.ingredients.clear()
-            self.create_ingredients(instance, ingredients_data)
+            with shopping_lists_detached(instance.pk):
+                old_amounts = instance.get_ingredient_amounts()
+                instance.ingredients.clear()
+                self.create_ingredients(instance, ingredients_data)
+                ShoppingListItem.objects.update_recipe(instance, old_amounts)
 
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        if request is not None:
+            instance = Recipe.objects.for_user(request.user).get(
+                pk=instance.pk
+            )
         return RecipeSerializer(instance, context=self.context).data
@@ -0,0 +1,243 @@
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import bump_ingredients_version
+from .catalog import bump_tags_version
+from .images import build_avatar_variants, build_recipe_variants
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, ShoppingListItem, Tag)
+from .pagination import bump_counts_version
+from .response_cache import response_cache
+from jobs.queue import enqueue
+from users.models import Subscription, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """Сбрасывает индекс автодополнения после изменения ингредиентов."""
+    transaction.on_commit(bump_ingredients_version)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    """Меняет версию справочника тегов для условных запросов."""
+    transaction.on_commit(bump_tags_version)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=User)
+@receiver((post_save, post_delete), sender=Subscription)
+def paginated_list_changed(sender, update_fields=None, **kwargs):
+    """
+    Сбрасывает закэшированные количества запросов к таблице модели.
+
+    Теги рецепта меняются только вместе с сохранением самого рецепта,
+    поэтому отдельный обработчик m2m_changed не нужен: он отключил бы
+    быстрое добавление связей в ``tags.set()``. Запись last_login при
+    каждом входе на количества не влияет.
+    """
+    if update_fields is not None and update_fields <= {'last_login'}:
+        return
+    transaction.on_commit(partial(bump_counts_version, sender))
+
+
+# Денормализованные счётчики: модель связи -> (модель, поле связи, счётчик).
+COUNTERS = {
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'shopping_carts_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Subscription: (User, 'author_id', 'followers_count'),
+}
+
+
+def change_counter(instance, delta):
+    model, attname, field = COUNTERS[type(instance)]
+    model.objects.filter(pk=getattr(instance, attname)).update(
+        **{field: F(field) + delta}
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def counted_object_created(sender, instance, created, raw=False, **kwargs):
+    """
+    Увеличивает счётчик при создании связи.
+
+    Счётчик меняется одним UPDATE ... SET count = count + 1 в той же
+    транзакции, поэтому параллельные запросы не теряют изменений.
+    Расхождения исправляет команда rebuild_counters.
+    """
+    if created and not raw:
+        change_counter(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def counted_object_deleted(sender, instance, **kwargs):
+    """Уменьшает счётчик при удалении связи."""
+    change_counter(instance, -1)
+
+
+_detached = threading.local()
+
+
+def get_detached_recipes():
+    if not hasattr(_detached, 'recipe_ids'):
+        _detached.recipe_ids = set()
+    return _detached.recipe_ids
+
+
+@contextmanager
+def shopping_lists_detached(recipe_id):
+    """
+    Отключает пересчёт списков покупок по отдельным строкам корзин и
+    состава рецепта: вызывающий код пересчитывает их сам, сразу для
+    всех строк.
+    """
+    recipe_ids = get_detached_recipes()
+    recipe_ids.add(recipe_id)
+    try:
+        yield
+    finally:
+        recipe_ids.discard(recipe_id)
+
+
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=RecipeIngredient)
+def shopping_list_row_changing(sender, instance, raw=False, **kwargs):
+    """Запоминает прежнюю строку, которую изменяют, например в админке."""
+    instance._previous_row = None
+    if not raw and not instance._state.adding:
+        instance._previous_row = sender.objects.filter(
+            pk=instance.pk
+        ).first()
+
+
+def apply_shopping_list_row(instance, sign):
+    """Прибавляет строку корзины или состава рецепта к спискам покупок."""
+    if instance.recipe_id in get_detached_recipes():
+        return
+    if isinstance(instance, ShoppingCart):
+        ShoppingListItem.objects.add_recipe(
+            instance.user_id, instance.recipe_id, sign
+        )
+    else:
+        ShoppingListItem.objects.add_to_carts(
+            instance.recipe_id,
+            {instance.ingredient_id: sign * instance.amount}
+        )
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=RecipeIngredient)
+def shopping_list_row_saved(sender, instance, raw=False, **kwargs):
+    """
+    Переносит в списки покупок новую или изменённую строку корзины или
+    состава рецепта. Массовые вставки без сигналов пересчитывают
+    списки сами.
+    """
+    if raw:
+        return
+    previous = getattr(instance, '_previous_row', None)
+    if previous is not None:
+        apply_shopping_list_row(previous, -1)
+    apply_shopping_list_row(instance, 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=RecipeIngredient)
+def shopping_list_row_deleted(sender, instance, **kwargs):
+    """
+    Вычитает удалённую строку корзины или состава рецепта из списков
+    покупок.
+
+    При удалении рецепта каскадно удаляются и его корзины, и состав,
+    в любом порядке. Корзина вычитает состав, ещё оставшийся в базе, а
+    строка состава — из корзин, ещё оставшихся в базе, поэтому каждое
+    количество вычитается ровно один раз.
+    """
+    apply_shopping_list_row(instance, -1)
+
+
+def invalidate_responses(*tags):
+    transaction.on_commit(partial(response_cache.invalidate, *tags))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    """Сбрасывает кэш ленты и страницы рецепта."""
+    invalidate_responses('recipes', f'recipe:{instance.pk}')
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def recipe_counter_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш страниц и лент с этим рецептом: в них показаны
+    счётчики избранного и корзин.
+    """
+    invalidate_responses(f'recipe:{instance.recipe_id}')
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    """Сбрасывает кэш ленты и страницы рецепта при смене ингредиентов."""
+    invalidate_responses('recipes', f'recipe:{instance.recipe_id}')
+
+
+@receiver((post_save, post_delete), sender=User)
+def author_changed(sender, instance, **kwargs):
+    """Сбрасывает кэш ответов, где показан профиль автора."""
+    invalidate_responses(f'user:{instance.pk}')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(sender, **kwargs):
+    """Сбрасывает кэш ленты, отфильтрованной по тегам."""
+    invalidate_responses('tags')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    """Сбрасывает кэш ответов с ингредиентами рецептов."""
+    invalidate_responses('ingredients')
+
+
+def needs_variants(field_file, variants, update_fields):
+    if update_fields is not None and field_file.field.name not in (
+        update_fields
+    ):
+        return False
+    return bool(field_file) and variants.get('source') != field_file.name
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, update_fields=None, **kwargs):
+    """Ставит в очередь уменьшенные копии нового изображения рецепта."""
+    if needs_variants(
+        instance.image, instance.image_variants, update_fields
+    ):
+        enqueue(build_recipe_variants, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def avatar_saved(sender, instance, update_fields=None, **kwargs):
+    """Ставит в очередь уменьшенные копии нового аватара."""
+    if needs_variants(
+        instance.avatar, instance.avatar_variants, update_fields
+    ):
+        enqueue(build_avatar_variants, instance.pk)
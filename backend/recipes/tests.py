@@ -0,0 +1,1484 @@
+import base64
+import csv
+import io
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.admin.models import ADDITION, LogEntry
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.mixins import ListModelMixin
+from rest_framework.request import Request
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .bulk import iter_json
+from .checks import check_shared_cache
+from .fields import Base64ImageField
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, ShoppingListItem, Tag)
+from .response_cache import response_cache
+from users.models import Subscription, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+SMALL_PNG = base64.b64encode(bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010802000000907753'
+    'de0000000c49444154789c63606060000000040001f61738550000000049454e'
+    '44ae426082'
+)).decode()
+IMAGE = f'data:image/png;base64,{SMALL_PNG}'
+
+
+class RecipeDataMixin:
+    """Общие тестовые данные для рецептов."""
+    RECIPES_COUNT = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Reader', last_name='Reader'
+        )
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author'
+        )
+        cls.tag = Tag.objects.create(
+            name='завтрак', color='#E26C2D', slug='breakfast'
+        )
+        cls.ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(3)
+        ])
+        cls.recipes = []
+        for i in range(cls.RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'рецепт {i}',
+                image='recipes/images/test.png', text='текст',
+                cooking_time=10
+            )
+            recipe.tags.set([cls.tag])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=i + 1
+                )
+                for ingredient in cls.ingredients
+            ])
+            cls.recipes.append(recipe)
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeQueryCountTests(RecipeDataMixin, TestCase):
+    """Проверяет количество запросов к базе в эндпоинтах рецептов."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_flags_are_annotated(self):
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        flags = {
+            item['id']: (item['is_favorited'], item['is_in_shopping_cart'])
+            for item in response.data['results']
+        }
+        self.assertEqual(flags[self.recipes[0].id], (True, False))
+        self.assertEqual(flags[self.recipes[1].id], (False, True))
+        self.assertEqual(flags[self.recipes[2].id], (False, False))
+
+    def test_retrieve(self):
+        # Первый запрос — вычисление ETag для условного GET.
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/recipes/{self.recipes[0].id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+        self.assertFalse(response.data['is_in_shopping_cart'])
+
+    def test_create(self):
+        data = {
+            'name': 'новый рецепт',
+            'text': 'текст',
+            'cooking_time': 5,
+            'image': IMAGE,
+            'tags': [self.tag.id],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 2}
+                for ingredient in self.ingredients
+            ],
+        }
+        # Справочники тегов и ингредиентов загружаются одним запросом
+        # каждый, дальше проверка id идёт без базы данных. Ещё по одному
+        # запросу ставят в очередь создание копий изображения и
+        # увеличивают счётчик рецептов автора.
+        with self.assertNumQueries(13):
+            response = self.client.post(
+                '/api/recipes/', data, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.data['is_favorited'])
+
+    def test_partial_update(self):
+        recipe = Recipe.objects.create(
+            author=self.user, name='свой рецепт',
+            image='recipes/images/test.png', text='текст', cooking_time=10
+        )
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        data = {
+            'name': 'обновлённый рецепт',
+            'cooking_time': 15,
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 3}],
+        }
+        # Копий изображения ещё нет, сохранение ставит их в очередь.
+        with self.assertNumQueries(16):
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/', data, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_anonymous_list_has_false_flags(self):
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        for item in response.data['results']:
+            self.assertFalse(item['is_favorited'])
+            self.assertFalse(item['is_in_shopping_cart'])
+
+
+class RecipeQueryBudgetTests(RecipeDataMixin, TestCase):
+    """Проверяет, что страница рецептов не зависит от своего размера."""
+    RECIPES_COUNT = 12
+    LIST_QUERIES = 4
+    ANONYMOUS_LIST_QUERIES = 4
+    # Плюс проверка значений фильтров tags и author.
+    FILTERED_LIST_QUERIES = 6
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assert_list_budget(self, queries):
+        for limit in (1, 6, self.RECIPES_COUNT):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': limit}
+                    )
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_authenticated_list_budget(self):
+        self.client.force_authenticate(self.user)
+        self.assert_list_budget(self.LIST_QUERIES)
+
+    def test_anonymous_list_budget(self):
+        self.assert_list_budget(self.ANONYMOUS_LIST_QUERIES)
+
+    def test_filtered_list_budget(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(self.FILTERED_LIST_QUERIES):
+            response = self.client.get(
+                '/api/recipes/',
+                {'tags': 'breakfast', 'author': self.author.id}
+            )
+        self.assertEqual(response.data['count'], self.RECIPES_COUNT)
+
+    def test_list_with_multiple_authors(self):
+        other = User.objects.create_user(
+            username='other', email='other@example.com',
+            first_name='Other', last_name='Other'
+        )
+        Recipe.objects.create(
+            author=other, name='чужой рецепт',
+            image='recipes/images/test.png', text='текст', cooking_time=10
+        )
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            self.client.get('/api/recipes/', {'limit': 100})
+
+
+class DownloadShoppingCartTests(RecipeDataMixin, TestCase):
+    """Проверяет выгрузку и инкрементальный пересчёт списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.extra_ingredient = Ingredient.objects.create(
+            name='яблоко', measurement_unit='г'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        ShoppingCart.objects.create(user=self.author, recipe=self.recipes[3])
+        call_command('rebuild_shopping_lists', stdout=io.StringIO())
+        response = self.client.post(
+            f'/api/recipes/{self.recipes[2].id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 201)
+        # recipes[1] (amount=2) и recipes[2] (amount=3) в корзине.
+        self.expected_amount = 5
+
+    def download(self, **params):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_txt_is_default(self):
+        response, content = self.download()
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('shopping_list.txt', response['Content-Disposition'])
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'Список покупок:')
+        self.assertEqual(lines[2:], [
+            f'- {ingredient.name} (г) — {self.expected_amount}'
+            for ingredient in self.ingredients
+        ])
+
+    def test_csv(self):
+        response, content = self.download(format='csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], ['name', 'measurement_unit', 'amount'])
+        self.assertEqual(rows[1:], [
+            [ingredient.name, 'г', str(self.expected_amount)]
+            for ingredient in self.ingredients
+        ])
+
+    def test_json(self):
+        response, content = self.download(format='json')
+        self.assertEqual(json.loads(content), [
+            {
+                'name': ingredient.name,
+                'measurement_unit': 'г',
+                'amount': self.expected_amount,
+            }
+            for ingredient in self.ingredients
+        ])
+
+    def test_empty_json(self):
+        for recipe in self.recipes[1:3]:
+            self.client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+        _, content = self.download(format='json')
+        self.assertEqual(json.loads(content), [])
+
+    def test_unknown_format(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'xml'}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_download_reads_materialized_list(self):
+        with self.assertNumQueries(1):
+            self.download()
+
+    def assert_shopping_lists_consistent(self):
+        call_command(
+            'rebuild_shopping_lists', '--check', stdout=io.StringIO()
+        )
+
+    def test_remove_from_cart(self):
+        response = self.client.delete(
+            f'/api/recipes/{self.recipes[1].id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_shopping_lists_consistent()
+        self.client.delete(
+            f'/api/recipes/{self.recipes[2].id}/shopping_cart/'
+        )
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.user).exists()
+        )
+
+    def test_recipe_ingredients_change(self):
+        recipe = self.recipes[2]
+        Recipe.objects.filter(pk=recipe.pk).update(author=self.user)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {
+                'cooking_time': 10,
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 10},
+                    {'id': self.extra_ingredient.id, 'amount': 7},
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_shopping_lists_consistent()
+        _, content = self.download(format='json')
+        self.assertEqual(
+            [(item['name'], item['amount']) for item in json.loads(content)],
+            [
+                ('ингредиент 0', 12),
+                ('ингредиент 1', 2),
+                ('ингредиент 2', 2),
+                ('яблоко', 7),
+            ]
+        )
+
+    def test_recipe_delete(self):
+        recipe = self.recipes[1]
+        Recipe.objects.filter(pk=recipe.pk).update(author=self.user)
+        response = self.client.delete(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_shopping_lists_consistent()
+
+    def test_recipe_deleted_outside_api(self):
+        self.recipes[1].delete()
+        self.assert_shopping_lists_consistent()
+        _, content = self.download()
+        self.assertEqual(content.splitlines()[2:], [
+            f'- {ingredient.name} (г) — 3' for ingredient in self.ingredients
+        ])
+
+    def test_author_deleted(self):
+        self.author.delete()
+        self.assert_shopping_lists_consistent()
+        _, content = self.download(format='json')
+        self.assertEqual(json.loads(content), [])
+
+    def test_orm_changes_to_carts_and_ingredients(self):
+        cart = ShoppingCart.objects.create(
+            user=self.user, recipe=self.recipes[4]
+        )
+        self.assert_shopping_lists_consistent()
+        item = RecipeIngredient.objects.get(
+            recipe=self.recipes[2], ingredient=self.ingredients[0]
+        )
+        item.amount = 30
+        item.save()
+        RecipeIngredient.objects.create(
+            recipe=self.recipes[2], ingredient=self.extra_ingredient,
+            amount=4
+        )
+        self.assert_shopping_lists_consistent()
+        cart.recipe = self.recipes[0]
+        cart.save()
+        self.assert_shopping_lists_consistent()
+        RecipeIngredient.objects.filter(recipe=self.recipes[2]).delete()
+        cart.delete()
+        self.assert_shopping_lists_consistent()
+
+    def test_check_detects_drift(self):
+        ShoppingListItem.objects.filter(user=self.user).update(amount=1)
+        with self.assertRaises(CommandError):
+            self.assert_shopping_lists_consistent()
+        call_command('rebuild_shopping_lists', stdout=io.StringIO())
+        self.assert_shopping_lists_consistent()
+
+
+class CounterTests(RecipeDataMixin, TestCase):
+    """Проверяет денормализованные счётчики и их сверку."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_counters_consistent(self):
+        call_command('rebuild_counters', check=True, stdout=io.StringIO())
+
+    def test_initial_counters(self):
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipes[0].pk).favorites_count, 1
+        )
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).recipes_count,
+            self.RECIPES_COUNT
+        )
+        self.assert_counters_consistent()
+
+    def test_favorite_and_cart(self):
+        recipe = self.recipes[2]
+        for action in ('favorite', 'shopping_cart'):
+            response = self.client.post(f'/api/recipes/{recipe.id}/{action}/')
+            self.assertEqual(response.status_code, 201)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.shopping_carts_count, 1)
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.data['favorites_count'], 1)
+        self.assertEqual(response.data['shopping_carts_count'], 1)
+        response = self.client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 204)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assert_counters_consistent()
+
+    def test_save_keeps_concurrent_increments(self):
+        recipe = Recipe.objects.get(pk=self.recipes[3].pk)
+        Favorite.objects.create(user=self.author, recipe=recipe)
+        recipe.name = 'новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_save_is_a_single_update(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Читатель'
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_save_inserts_deleted_row(self):
+        recipe = Recipe.objects.get(pk=self.recipes[3].pk)
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        recipe.name = 'восстановленный'
+        recipe.save()
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).name, 'восстановленный'
+        )
+
+    def test_recipe_delete_and_subscription(self):
+        self.recipes[4].delete()
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        author = User.objects.get(pk=self.author.pk)
+        self.assertEqual(author.recipes_count, self.RECIPES_COUNT - 1)
+        self.assertEqual(author.followers_count, 1)
+        self.recipes[0].delete()
+        self.assert_counters_consistent()
+
+    def test_rebuild_repairs_drift(self):
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(favorites_count=7)
+        User.objects.filter(pk=self.author.pk).update(recipes_count=0)
+        with self.assertRaises(CommandError):
+            self.assert_counters_consistent()
+        call_command('rebuild_counters', stdout=io.StringIO())
+        self.assert_counters_consistent()
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipes[0].pk).favorites_count, 1
+        )
+
+
+class AdminChangelistTests(RecipeDataMixin, TestCase):
+    """Проверяет, что списки в админке не делают запросов на строку."""
+    # Сессия, пользователь, количество и строки страницы. Для рецептов
+    # ещё один запрос на фильтр по тегам, у небольшого справочника тегов
+    # дополнительно считается общее количество.
+    CHANGELIST_QUERIES = {
+        'recipes/recipe': 5,
+        'recipes/ingredient': 4,
+        'recipes/tag': 5,
+        'recipes/favorite': 4,
+        'recipes/shoppingcart': 4,
+        'users/user': 4,
+        'users/subscription': 4,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin',
+            first_name='Admin', last_name='Admin'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def add_rows(self):
+        for i in range(3):
+            author = User.objects.create_user(
+                username=f'extra{i}', email=f'extra{i}@example.com',
+                first_name='Extra', last_name='Extra'
+            )
+            recipe = Recipe.objects.create(
+                author=author, name=f'ещё рецепт {i}',
+                image='recipes/images/test.png', text='текст',
+                cooking_time=10
+            )
+            recipe.tags.set([self.tag])
+            Favorite.objects.create(user=author, recipe=recipe)
+            ShoppingCart.objects.create(user=author, recipe=recipe)
+            Subscription.objects.create(user=author, author=self.author)
+
+    def assert_changelists(self):
+        for path, queries in self.CHANGELIST_QUERIES.items():
+            with self.subTest(path=path):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = self.client.get(f'/admin/{path}/')
+                self.assertEqual(response.status_code, 200)
+
+    def test_query_count_does_not_depend_on_rows(self):
+        self.assert_changelists()
+        self.add_rows()
+        self.assert_changelists()
+
+    def test_count_is_cached(self):
+        self.client.get('/admin/recipes/recipe/')
+        with self.assertNumQueries(
+            self.CHANGELIST_QUERIES['recipes/recipe'] - 1
+        ):
+            self.client.get('/admin/recipes/recipe/')
+
+    def test_recipe_search_and_author_filter(self):
+        response = self.client.get(
+            '/admin/recipes/recipe/', {'q': 'рецепты'}
+        )
+        self.assertEqual(
+            response.context['cl'].result_count, self.RECIPES_COUNT
+        )
+        # Часть слова полнотекстовый поиск не находит.
+        response = self.client.get(
+            '/admin/recipes/recipe/', {'q': 'ЦЕП'}
+        )
+        self.assertEqual(
+            response.context['cl'].result_count, self.RECIPES_COUNT
+        )
+        response = self.client.get(
+            '/admin/recipes/recipe/', {'q': 'AUTH'}
+        )
+        self.assertEqual(
+            response.context['cl'].result_count, self.RECIPES_COUNT
+        )
+        response = self.client.get(
+            '/admin/recipes/recipe/', {'author__id__exact': self.user.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_recipe_change_form_uses_autocomplete(self):
+        response = self.client.get(
+            f'/admin/recipes/recipe/{self.recipes[0].pk}/change/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'admin-autocomplete')
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']
+)
+class LoadDataTests(TestCase):
+    """Проверяет потоковую массовую загрузку данных."""
+
+    def setUp(self):
+        cache.clear()
+        self.data_path = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.data_path, ignore_errors=True)
+        (self.data_path / 'images').mkdir()
+        (self.data_path / 'images' / 'dish.png').write_bytes(
+            base64.b64decode(make_image_uri((40, 30)).split(',')[1])
+        )
+        users = [
+            {'username': f'user{i}', 'email': f'user{i}@Example.com',
+             'first_name': 'Имя', 'last_name': 'Фамилия',
+             'password': 'secret-password'}
+            for i in range(5)
+        ]
+        ingredients = [
+            {'name': f'ингредиент {i}', 'measurement_unit': 'г'}
+            for i in range(4)
+        ]
+        self.write_json('users.json', users)
+        self.write_json('ingredients.json', ingredients)
+        with open(self.data_path / 'recipes.jsonl', 'w') as file:
+            for i in range(7):
+                file.write(json.dumps({
+                    'author_username': f'user{i % 2}',
+                    'name': f'рецепт {i}', 'image': 'dish.png',
+                    'text': 'текст', 'cooking_time': 10,
+                    'tags': ['завтрак', 'неизвестный'],
+                    'ingredients': [
+                        {'name': 'ингредиент 1', 'measurement_unit': 'г',
+                         'amount': i + 1},
+                    ],
+                }, ensure_ascii=False) + '\n')
+
+    def write_json(self, name, data):
+        with open(self.data_path / name, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+
+    def load(self, **options):
+        call_command(
+            'load_data', data_path=self.data_path, batch_size=2,
+            stdout=io.StringIO(), **options
+        )
+
+    def test_load(self):
+        self.load(workers=2)
+        self.assertEqual(User.objects.count(), 5)
+        user = User.objects.get(username='user0')
+        self.assertEqual(user.email, 'user0@example.com')
+        self.assertTrue(user.check_password('secret-password'))
+        self.assertEqual(user.recipes_count, 4)
+        self.assertEqual(Recipe.objects.count(), 7)
+        self.assertEqual(RecipeIngredient.objects.count(), 7)
+        self.assertEqual(
+            Recipe.objects.filter(tags__slug='breakfast').count(), 7
+        )
+        images = set(Recipe.objects.values_list('image', flat=True))
+        self.assertEqual(len(images), 1)
+        recipe = Recipe.objects.first()
+        self.assertEqual(recipe.image_variants['source'], recipe.image.name)
+        call_command('rebuild_counters', check=True, stdout=io.StringIO())
+
+    def test_reload_replaces_data(self):
+        self.load(workers=1)
+        self.load(workers=1)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Ingredient.objects.count(), 4)
+        self.assertEqual(Recipe.objects.count(), 7)
+
+    def test_unknown_ingredient(self):
+        self.write_json('ingredients.json', [
+            {'name': 'другое', 'measurement_unit': 'г'}
+        ])
+        with self.assertRaisesMessage(CommandError, 'ингредиент 1'):
+            self.load(workers=1)
+
+    def test_prep_tests_resets_caches(self):
+        self.assertEqual(self.client.get('/api/tags/').json(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('prep_tests', stdout=io.StringIO())
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 6)
+
+    def test_iter_json_across_chunks(self):
+        records = list(iter_json(
+            self.data_path / 'users.json', chunk_size=7
+        ))
+        self.assertEqual(
+            [record['username'] for record in records],
+            [f'user{i}' for i in range(5)]
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDatasetTests(TestCase):
+    """Проверяет генератор синтетических данных."""
+    SCALE = 200
+
+    def generate(self, seed=1):
+        cache.clear()
+        call_command(
+            'generate_dataset', scale=self.SCALE, seed=seed, batch_size=64,
+            stdout=io.StringIO()
+        )
+        return (
+            list(Recipe.objects.order_by('pk').values_list(
+                'author_id', 'name', 'cooking_time', 'pub_date'
+            )),
+            list(User.objects.order_by('pk').values_list(
+                'pk', 'date_joined'
+            )),
+            set(Favorite.objects.values_list('user_id', 'recipe_id')),
+        )
+
+    def test_dataset_is_consistent_and_skewed(self):
+        self.generate()
+        self.assertEqual(User.objects.count(), self.SCALE)
+        self.assertEqual(Recipe.objects.count(), self.SCALE)
+        self.assertTrue(Subscription.objects.exists())
+        self.assertTrue(RecipeIngredient.objects.exists())
+        call_command('rebuild_counters', check=True, stdout=io.StringIO())
+        call_command(
+            'rebuild_shopping_lists', check=True, stdout=io.StringIO()
+        )
+        counts = sorted(
+            User.objects.values_list('recipes_count', flat=True),
+            reverse=True
+        )
+        # Самые активные авторы пишут намного больше среднего.
+        self.assertGreater(counts[0], 10 * sum(counts) / len(counts))
+        response = APIClient().get('/api/recipes/', {'limit': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], self.SCALE)
+
+    def test_same_seed_gives_same_data(self):
+        first = self.generate(seed=7)
+        self.assertEqual(self.generate(seed=7), first)
+        self.assertNotEqual(self.generate(seed=8), first)
+
+    def test_clear_keeps_superusers(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        user = User.objects.create_user(
+            username='old', email='old@example.com'
+        )
+        Token.objects.create(user=user)
+        user.groups.add(Group.objects.create(name='авторы'))
+        LogEntry.objects.log_actions(
+            user.pk, [admin], ADDITION, single_object=True
+        )
+        self.generate()
+        self.assertTrue(User.objects.filter(pk=admin.pk).exists())
+        self.assertFalse(User.objects.filter(username='old').exists())
+        self.assertFalse(Token.objects.exists())
+        self.assertEqual(User.objects.count(), self.SCALE + 1)
+
+
+class BenchmarkEndpointsTests(RecipeDataMixin, TestCase):
+    """Проверяет замер эндпоинтов и сравнение с эталоном."""
+
+    def setUp(self):
+        cache.clear()
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.baseline = Path(tempfile.mkdtemp()) / 'baseline.json'
+        self.addCleanup(shutil.rmtree, self.baseline.parent)
+
+    def benchmark(self, **options):
+        output = io.StringIO()
+        call_command(
+            'benchmark_endpoints', requests=3, warmup=1, stdout=output,
+            stderr=output, **options
+        )
+        return output.getvalue()
+
+    def test_baseline_round_trip(self):
+        favorites = set(Favorite.objects.values_list('user', 'recipe'))
+        output = self.benchmark(save_baseline=self.baseline)
+        self.assertIn('download_shopping_cart', output)
+        self.assertEqual(
+            set(Favorite.objects.values_list('user', 'recipe')), favorites
+        )
+        baseline = json.loads(self.baseline.read_text())
+        self.assertEqual(baseline['transport'], 'in-process')
+        self.assertEqual(baseline['scenarios']['recipe_detail']['queries'], 5)
+
+        # Задержки с большим запасом, число запросов — меньше текущего.
+        for result in baseline['scenarios'].values():
+            result['p50'] = result['p99'] = 10_000
+        self.baseline.write_text(json.dumps(baseline))
+        self.assertIn('Регрессий нет', self.benchmark(
+            baseline=self.baseline, scenario=['recipe_detail']
+        ))
+        baseline['scenarios']['recipe_detail']['queries'] = 1
+        self.baseline.write_text(json.dumps(baseline))
+        with self.assertRaisesMessage(CommandError, 'Регрессий: 1'):
+            self.benchmark(baseline=self.baseline, scenario=['recipe_detail'])
+
+    def test_unknown_scenario(self):
+        with self.assertRaisesMessage(CommandError, 'missing'):
+            self.benchmark(scenario=['missing'])
+
+
+class IngredientSearchTests(TestCase):
+    """Проверяет поиск ингредиентов по началу названия."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in (
+                ('молоко', 'мл'),
+                ('молоко', 'г'),
+                ('молоко сгущённое', 'г'),
+                ('Молодой картофель', 'г'),
+                ('мука', 'г'),
+                ('яблоко', 'шт'),
+            )
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def search(self, **params):
+        response = self.client.get('/api/ingredients/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(item['name'], item['measurement_unit'])
+                for item in response.json()]
+
+    def test_prefix_is_case_insensitive(self):
+        self.assertEqual(self.search(name='МОЛО'), [
+            ('Молодой картофель', 'г'),
+            ('молоко', 'г'),
+            ('молоко', 'мл'),
+            ('молоко сгущённое', 'г'),
+        ])
+
+    def test_exact_match_first(self):
+        self.assertEqual(self.search(name='молоко', limit=2), [
+            ('молоко', 'г'),
+            ('молоко', 'мл'),
+        ])
+
+    def test_invalid_limit(self):
+        response = self.client.get(
+            '/api/ingredients/', {'name': 'м', 'limit': 'abc'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_steady_state_skips_database(self):
+        self.search(name='м')
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.search(name='мук')), 1)
+
+    def test_index_is_rebuilt_after_change(self):
+        self.assertEqual(self.search(name='ябл'), [('яблоко', 'шт')])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(
+                name='яблочный сок', measurement_unit='мл'
+            )
+        self.assertEqual(self.search(name='ябл'), [
+            ('яблоко', 'шт'),
+            ('яблочный сок', 'мл'),
+        ])
+
+    @override_settings(INGREDIENT_INDEX_CHECK_INTERVAL=0)
+    def test_index_sees_import_without_version_bump(self):
+        self.assertEqual(self.search(name='ябл'), [('яблоко', 'шт')])
+        # Загрузка другим процессом: сигналов и общей версии нет.
+        Ingredient.objects.bulk_create([
+            Ingredient(name='яблочный сок', measurement_unit='мл')
+        ])
+        self.assertEqual(self.search(name='ябл'), [
+            ('яблоко', 'шт'),
+            ('яблочный сок', 'мл'),
+        ])
+
+    def test_without_name_returns_catalog(self):
+        self.assertEqual(len(self.search()), 6)
+
+    def test_fuzzy_finds_misspelled_name(self):
+        self.assertEqual(
+            self.search(name='малоко', mode='fuzzy')[:2],
+            [('молоко', 'г'), ('молоко', 'мл')]
+        )
+
+    def test_fuzzy_ranks_prefix_matches_first(self):
+        results = self.search(name='молоко', mode='fuzzy')
+        self.assertEqual(results[:3], [
+            ('молоко', 'г'),
+            ('молоко', 'мл'),
+            ('молоко сгущённое', 'г'),
+        ])
+
+    def test_unknown_mode(self):
+        response = self.client.get(
+            '/api/ingredients/', {'name': 'м', 'mode': 'regex'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeSearchTests(TestCase):
+    """Проверяет полнотекстовый поиск рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author'
+        )
+        cls.breakfast = Tag.objects.create(
+            name='завтрак', color='#E26C2D', slug='breakfast'
+        )
+        cls.dinner = Tag.objects.create(
+            name='ужин', color='#8775D2', slug='dinner'
+        )
+        recipes = (
+            ('Блины с мёдом', 'Тонкие блины на молоке.', cls.breakfast),
+            ('Сырники', 'Подавать с блинами и сметаной.', cls.breakfast),
+            ('Борщ', 'Варить свёклу и капусту.', cls.dinner),
+            ('Блинный торт', 'Слои блинов и крема.', cls.dinner),
+        )
+        cls.recipes = {}
+        for name, text, tag in recipes:
+            recipe = Recipe.objects.create(
+                author=cls.author, name=name, text=text,
+                image='recipes/images/test.png', cooking_time=10
+            )
+            recipe.tags.set([tag])
+            cls.recipes[name] = recipe
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def search(self, **params):
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data['results']]
+
+    def test_search_uses_russian_stemming(self):
+        self.assertEqual(self.search(search='свекла капуста'), ['Борщ'])
+        self.assertEqual(self.search(search='свёклой'), ['Борщ'])
+
+    def test_name_matches_rank_above_text(self):
+        results = self.search(search='блины')
+        self.assertEqual(results[-1], 'Сырники')
+        self.assertEqual(
+            set(results), {'Блины с мёдом', 'Сырники', 'Блинный торт'}
+        )
+
+    def test_search_combines_with_tags(self):
+        self.assertEqual(
+            self.search(search='блины', tags='breakfast')[-1], 'Сырники'
+        )
+        self.assertEqual(
+            self.search(search='блины', tags='dinner'), ['Блинный торт']
+        )
+
+    def test_no_matches(self):
+        self.assertEqual(self.search(search='пицца'), [])
+
+
+class PaginationCountTests(RecipeDataMixin, TestCase):
+    """Проверяет кэширование и оценку количества записей в списках."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_count_is_cached_per_filter(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(4):
+            self.client.get('/api/recipes/')
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.data['count'], self.RECIPES_COUNT)
+        self.assertTrue(response.data['count_is_exact'])
+        response = self.client.get(
+            '/api/recipes/', {'author': self.user.id}
+        )
+        self.assertEqual(response.data['count'], 0)
+
+    def test_count_is_reset_after_write(self):
+        self.client.get('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(
+                author=self.author, name='новый рецепт',
+                image='recipes/images/test.png', text='текст',
+                cooking_time=10
+            )
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.data['count'], self.RECIPES_COUNT + 1)
+
+    def test_unrelated_writes_keep_cached_count(self):
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.last_login = timezone.now()
+            self.author.save(update_fields=('last_login',))
+            Subscription.objects.create(user=self.user, author=self.author)
+        with self.assertNumQueries(3):
+            self.client.get('/api/recipes/')
+
+    @override_settings(PAGINATION_EXACT_COUNT_LIMIT=2)
+    def test_pages_beyond_underestimate(self):
+        with mock.patch(
+            'recipes.pagination.CachedCountPaginator.estimate_count',
+            return_value=3
+        ):
+            response = self.client.get('/api/recipes/', {'limit': 1})
+            self.assertEqual(response.data['count'], 3)
+            response = self.client.get(
+                '/api/recipes/', {'limit': 1, 'page': 3}
+            )
+            self.assertIsNotNone(response.data['next'])
+            response = self.client.get(
+                '/api/recipes/', {'limit': 1, 'page': self.RECIPES_COUNT}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), 1)
+            self.assertIsNone(response.data['next'])
+            response = self.client.get(
+                '/api/recipes/',
+                {'limit': 1, 'page': self.RECIPES_COUNT + 1}
+            )
+            self.assertEqual(response.status_code, 404)
+
+    @override_settings(PAGINATION_EXACT_COUNT_LIMIT=2)
+    def test_large_count_is_estimated(self):
+        response = self.client.get('/api/recipes/')
+        self.assertFalse(response.data['count_is_exact'])
+        self.assertGreater(response.data['count'], 2)
+        response = self.client.get(
+            '/api/recipes/', {'author': self.user.id}
+        )
+        self.assertTrue(response.data['count_is_exact'])
+
+
+class RecipeKeysetPaginationTests(RecipeDataMixin, TestCase):
+    """Проверяет пагинацию ленты рецептов по курсору."""
+    RECIPES_COUNT = 7
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_walks_feed_without_duplicates(self):
+        expected = list(
+            Recipe.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+        url, params = '/api/recipes/', {'cursor': '', 'limit': 3}
+        received = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            received.extend(item['id'] for item in response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual(received, expected)
+
+    def test_page_does_not_count_rows(self):
+        with self.assertNumQueries(3) as context:
+            response = self.client.get(
+                '/api/recipes/', {'cursor': '', 'limit': 2}
+            )
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in context.captured_queries
+        ))
+
+    def test_invalid_cursor(self):
+        for cursor in ('abc', 'WzFd', 'WyJ4IiwgMV0='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    '/api/recipes/', {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get('/api/recipes/', {'limit': 2})
+        self.assertEqual(response.data['count'], self.RECIPES_COUNT)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class ConditionalRequestTests(RecipeDataMixin, TestCase):
+    """Проверяет ответы 304 для справочников и рецептов."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_tags_not_modified(self):
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_tags_modified_after_change(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='обед', color='#49B64E', slug='lunch')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_ingredients_if_modified_since(self):
+        response = self.client.get('/api/ingredients/', {'name': 'ингр'})
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/ingredients/', {'name': 'ингр'},
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_recipe_not_modified(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        self.client.force_authenticate(self.user)
+        response = self.client.get(url)
+        self.assertIn('Authorization', response['Vary'])
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_recipe_etag_depends_on_user_flags(self):
+        url = f'/api/recipes/{self.recipes[2].id}/'
+        self.client.force_authenticate(self.user)
+        etag = self.client.get(url)['ETag']
+        Favorite.objects.create(user=self.user, recipe=self.recipes[2])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+        self.client.force_authenticate(self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_recipe_etag_changes_after_update(self):
+        recipe = self.recipes[2]
+        url = f'/api/recipes/{recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        recipe.cooking_time = 20
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cooking_time'], 20)
+
+    def test_missing_recipe(self):
+        self.assertEqual(
+            self.client.get('/api/recipes/0/').status_code, 404
+        )
+
+
+class AnonymousResponseCacheTests(RecipeDataMixin, TestCase):
+    """Проверяет кэш ответов ленты для анонимных пользователей."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_second_request_is_served_from_cache(self):
+        Tag.objects.create(name='обед', color='#49B64E', slug='lunch')
+        self.client.get('/api/recipes/', {'tags': ['lunch', 'breakfast']})
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/recipes/', {'tags': ['breakfast', 'lunch'], 'page': 1}
+            )
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['count'], self.RECIPES_COUNT)
+        self.assertEqual(response_cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_authenticated_and_unknown_params_bypass_cache(self):
+        self.client.get('/api/recipes/', {'search': 'рецепт'})
+        response = self.client.get('/api/recipes/', {'search': 'рецепт'})
+        self.assertNotIn('X-Cache', response)
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/recipes/')
+        self.assertNotIn('X-Cache', response)
+
+    def test_recipe_change_invalidates_list_and_detail(self):
+        recipe = self.recipes[0]
+        self.client.get('/api/recipes/')
+        self.client.get(f'/api/recipes/{recipe.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.filter(recipe=recipe).delete()
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['ingredients'], [])
+
+    def test_author_change_invalidates_only_their_pages(self):
+        self.client.get('/api/recipes/')
+        self.client.get('/api/recipes/', {'author': self.user.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.author.pk).update(first_name='New')
+            self.author.refresh_from_db()
+            self.author.save()
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(
+            response.data['results'][0]['author']['first_name'], 'New'
+        )
+        response = self.client.get('/api/recipes/', {'author': self.user.id})
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_favorite_invalidates_recipe_pages(self):
+        recipe = self.recipes[0]
+        self.client.get('/api/recipes/')
+        self.client.get(f'/api/recipes/{recipe.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.author, recipe=recipe)
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['favorites_count'], 2)
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_invalidation_during_compute_is_not_stored(self):
+        def invalidate_author(*args, **kwargs):
+            response_cache.invalidate(f'user:{self.author.id}')
+            return compute(*args, **kwargs)
+
+        compute = ListModelMixin.list
+        with mock.patch.object(ListModelMixin, 'list', invalidate_author):
+            self.client.get('/api/recipes/')
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_concurrent_recompute_is_not_stored(self):
+        key = response_cache.make_key(
+            Request(self.client.get('/api/recipes/').wsgi_request), 'list'
+        )
+        cache.clear()
+        cache.add(f'{key}:lock', 1)
+        with mock.patch.object(response_cache, 'wait_interval', 0):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(cache.get(key))
+
+
+class CatalogCacheTests(RecipeDataMixin, TestCase):
+    """Проверяет справочники тегов и ингредиентов в памяти процесса."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_catalogs_skip_database_in_steady_state(self):
+        self.client.get('/api/tags/')
+        self.client.get('/api/ingredients/')
+        with self.assertNumQueries(0):
+            tags = self.client.get('/api/tags/')
+            ingredients = self.client.get('/api/ingredients/')
+            ingredient = self.client.get(
+                f'/api/ingredients/{self.ingredients[0].id}/'
+            )
+        self.assertEqual(tags.json(), [{
+            'id': self.tag.id, 'name': 'завтрак', 'color': '#E26C2D',
+            'slug': 'breakfast'
+        }])
+        self.assertEqual(len(ingredients.json()), len(self.ingredients))
+        self.assertEqual(ingredient.data['name'], 'ингредиент 0')
+        self.assertEqual(
+            self.client.get('/api/ingredients/0/').status_code, 404
+        )
+
+    def test_catalog_is_reloaded_after_change(self):
+        self.client.get('/api/tags/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.name = 'ужин'
+            self.tag.save()
+        self.assertEqual(self.client.get('/api/tags/').json()[0]['name'],
+                         'ужин')
+
+    def test_recipe_validation_uses_catalogs(self):
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/tags/')
+        self.client.get('/api/ingredients/')
+        data = {
+            'name': 'рецепт',
+            'text': 'текст',
+            'cooking_time': 5,
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+        }
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                '/api/recipes/', {**data, 'tags': [0]}, format='json'
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tags', response.data)
+        response = self.client.post(
+            '/api/recipes/',
+            {**data, 'ingredients': [{'id': 'x', 'amount': 1}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
+
+
+class SharedCacheCheckTests(TestCase):
+    """Проверяет требование общего кэша в рабочем окружении."""
+
+    def test_process_local_cache_is_an_error(self):
+        errors = check_shared_cache(None)
+        self.assertEqual([error.id for error in errors], ['recipes.E001'])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+    }})
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class StaleCatalogTests(TransactionTestCase):
+    """Проверяет запись рецепта по устаревшему справочнику."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author'
+        )
+        self.tag = Tag.objects.create(
+            name='завтрак', color='#E26C2D', slug='breakfast'
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+
+    def test_deleted_ingredient_is_a_validation_error(self):
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/ingredients/')
+        # Удаление без сигналов: другой процесс, чей сброс версии
+        # справочника сюда не дошёл.
+        Ingredient.objects.filter(pk=self.ingredient.pk)._raw_delete(
+            'default'
+        )
+        response = self.client.post('/api/recipes/', {
+            'name': 'рецепт',
+            'text': 'текст',
+            'cooking_time': 5,
+            'image': IMAGE,
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Recipe.objects.exists())
+
+
+def make_image_uri(size, image_format='PNG', mime='image/png'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, format=image_format)
+    return (f'data:{mime};base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class Base64ImageFieldTests(TestCase):
+    """Проверяет декодирование изображений в Base64."""
+
+    def decode(self, data):
+        return Base64ImageField().to_internal_value(data)
+
+    def test_format_is_detected_from_signature(self):
+        image = self.decode(make_image_uri((2, 2), 'GIF', 'image/png'))
+        self.assertTrue(image.name.endswith('.gif'))
+        self.assertEqual(image.content_type, 'image/gif')
+
+    def test_small_image_stays_in_memory(self):
+        image = self.decode(IMAGE)
+        self.assertNotIsInstance(image, TemporaryUploadedFile)
+        self.assertTrue(image.name.endswith('.png'))
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_large_image_is_spooled_to_disk(self):
+        image = self.decode(make_image_uri((64, 64)))
+        self.assertIsInstance(image, TemporaryUploadedFile)
+        with Image.open(image.temporary_file_path()) as decoded:
+            self.assertEqual(decoded.size, (64, 64))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=50)
+    def test_too_large(self):
+        with self.assertRaisesMessage(ValidationError, '50 байт'):
+            self.decode(make_image_uri((64, 64)))
+
+    @override_settings(IMAGE_UPLOAD_MAX_DIMENSION=32)
+    def test_too_many_pixels(self):
+        self.decode(make_image_uri((32, 32)))
+        with self.assertRaisesMessage(ValidationError, '32 пикселей'):
+            self.decode(make_image_uri((33, 10)))
+
+    def test_wrapped_base64(self):
+        uri = make_image_uri((64, 64))
+        prefix, payload = uri.split(',')
+        wrapped = '\r\n'.join(
+            payload[i:i + 76] for i in range(0, len(payload), 76)
+        )
+        image = self.decode(f'{prefix},\n{wrapped}\n')
+        with Image.open(image) as decoded:
+            self.assertEqual(decoded.size, (64, 64))
+
+    def test_corrupt_header_is_rejected(self):
+        header = base64.b64encode(
+            b'\x89PNG\r\n\x1a\n' + b'\x00' * 28
+        ).decode()
+        with self.assertRaises(ValidationError):
+            Base64ImageField().check_dimensions(
+                Base64ImageField().decode(f'data:image/png;base64,{header}')
+            )
+
+    def test_invalid_data(self):
+        text = base64.b64encode(b'not an image at all').decode()
+        for data in (
+            'data:image/png;base64,',
+            'data:image/png;base64,abc',
+            'data:image/png;base64,ab!=',
+            'data:image/png,abcd',
+            f'data:image/png;base64,{text}',
+        ):
+            with self.subTest(data=data):
+                with self.assertRaises(ValidationError):
+                    self.decode(data)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, JOBS_EAGER=True)
+class ImageVariantsTests(RecipeDataMixin, TestCase):
+    """Проверяет уменьшенные копии изображений рецептов и аватаров."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self):
+        data = {
+            'name': 'рецепт с фото',
+            'text': 'текст',
+            'cooking_time': 5,
+            'image': make_image_uri((700, 350)),
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Recipe.objects.get(pk=response.data['id'])
+
+    def test_recipe_variants(self):
+        recipe = self.create_recipe()
+        self.assertEqual(
+            recipe.image_variants['formats'], {'webp': [320, 640]}
+        )
+        name = recipe.image.name.rsplit('.', 1)[0]
+        with recipe.image.storage.open(f'{name}_320.webp') as file:
+            with Image.open(file) as image:
+                self.assertEqual(image.size, (320, 160))
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        srcset = response.data['image_srcset']['webp'].split(', ')
+        self.assertEqual(len(srcset), 2)
+        self.assertTrue(srcset[0].startswith('http://testserver/media/'))
+        self.assertTrue(srcset[1].endswith('_640.webp 640w'))
+
+    def test_avatar_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(
+                '/api/users/me/avatar/',
+                {'avatar': make_image_uri((100, 100))}, format='json'
+            )
+        self.user.refresh_from_db()
+        response = self.client.get('/api/users/me/')
+        self.assertTrue(
+            response.data['avatar_srcset']['webp'].endswith('_64.webp 64w')
+        )
+
+    def test_stale_variants_are_hidden(self):
+        recipe = self.create_recipe()
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image='recipes/images/other.png'
+        )
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.data['image_srcset'], {})
+
+    def test_backfill_command(self):
+        recipe = self.create_recipe()
+        Recipe.objects.filter(pk=recipe.pk).update(image_variants={})
+        out = io.StringIO()
+        call_command('build_image_variants', stdout=out)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants['source'], recipe.image.name)
+        self.assertIn('Рецепты: создано 1', out.getvalue())
@@ -1,36 +1,125 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from functools import partial
+
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 
+from .autocomplete import get_ingredients_version, ingredient_index
+from .catalog import get_tags_version, ingredient_catalog, tag_catalog
+from .conditional import catalog_condition, recipe_condition
 from .filters import IngredientSearchFilter, RecipeFilter
-from .models import (Favorite, Ingredient, Recipe,
-                     ShoppingCart, Tag)
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                     ShoppingListItem, Tag)
+from .pagination import FeedPagination
 from .permissions import IsAuthorOrReadOnly
+from .renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                        ShoppingListTextRenderer)
+from .response_cache import response_cache
 from .serializers import (IngredientSerializer, RecipeCreateUpdateSerializer,
                           RecipeSerializer, TagSerializer)
+from .signals import shopping_lists_detached
 from users.serializers import RecipeMinifiedSerializer
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class CatalogViewSetMixin:
+    """
+    Отдаёт справочник из памяти процесса.
+
+    Список в формате JSON отдаётся заранее сериализованными байтами,
+    отдельный объект берётся из словаря по id.
+    """
+    catalog = None
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == 'json':
+            return HttpResponse(
+                self.catalog.content(), content_type='application/json'
+            )
+        return Response(self.catalog.data())
+
+    def get_object(self):
+        try:
+            pk = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404
+        obj = self.catalog.get(pk)
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+@method_decorator(catalog_condition(get_tags_version), name='list')
+@method_decorator(catalog_condition(get_tags_version), name='retrieve')
+class TagViewSet(CatalogViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet для работы с тегами."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    catalog = tag_catalog
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+@method_decorator(
+    catalog_condition(get_ingredients_version), name='retrieve'
+)
+class IngredientViewSet(CatalogViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet для работы с ингредиентами."""
+    catalog = ingredient_catalog
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (IngredientSearchFilter,)
     search_fields = ('^name',)
     pagination_class = None
 
+    def get_limit(self):
+        """Проверяет и возвращает параметр limit."""
+        limit = self.request.query_params.get('limit')
+        if not limit:
+            return None
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise ValidationError(
+                {'limit': 'Параметр limit должен быть целым положительным '
+                          'числом.'}
+            )
+        return limit
+
+    @method_decorator(catalog_condition(get_ingredients_version))
+    def list(self, request, *args, **kwargs):
+        """
+        Ищет ингредиенты по названию.
+
+        В режиме prefix (по умолчанию) поиск идёт по началу названия
+        в индексе процесса, не обращаясь к базе данных. В режиме fuzzy
+        база данных ищет похожие названия по триграммам.
+        """
+        name = request.query_params.get(IngredientSearchFilter.search_param)
+        if not name:
+            return super().list(request, *args, **kwargs)
+        mode = request.query_params.get('mode', 'prefix')
+        limit = self.get_limit()
+        if mode == 'prefix':
+            ingredients = ingredient_index.search(name, limit)
+        elif mode == 'fuzzy':
+            ingredients = Ingredient.objects.fuzzy_search(name)[:limit]
+        else:
+            raise ValidationError(
+                {'mode': 'Параметр mode должен быть prefix или fuzzy.'}
+            )
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """ViewSet для работы с рецептами."""
@@ -38,6 +127,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = FeedPagination
+
+    def get_queryset(self):
+        return super().get_queryset().for_user(self.request.user)
 
     def get_permissions(self):
         if self.action in ('list', 'retrieve'):
@@ -51,9 +144,46 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeCreateUpdateSerializer
         return RecipeSerializer
 
+    def list(self, request, *args, **kwargs):
+        if not response_cache.is_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        return response_cache.respond(
+            request, 'list', ('recipes', 'tags', 'ingredients'),
+            partial(super().list, request, *args, **kwargs),
+            lambda data: {
+                tag
+                for recipe in data['results']
+                for tag in (f'user:{recipe["author"]["id"]}',
+                            f'recipe:{recipe["id"]}')
+            }
+        )
+
+    @method_decorator(recipe_condition)
+    def retrieve(self, request, *args, **kwargs):
+        if response_cache.is_cacheable(request):
+            response = response_cache.respond(
+                request, f'recipe:{kwargs["pk"]}',
+                (f'recipe:{kwargs["pk"]}', 'ingredients'),
+                partial(super().retrieve, request, *args, **kwargs),
+                lambda data: {f'user:{data["author"]["id"]}'}
+            )
+        else:
+            response = super().retrieve(request, *args, **kwargs)
+        # ETag зависит от пользователя, общий кэш не должен его смешивать.
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Одно вычитание из всех корзин вместо пересчёта по каждой
+        # удаляемой строке корзины и состава.
+        with shopping_lists_detached(instance.pk):
+            ShoppingListItem.objects.remove_recipe_from_carts(instance)
+            instance.delete()
+
     def _add_or_remove_relation(self, request, pk, model):
         """Вспомогательный метод для добавления/удаления связи с рецептом."""
         recipe = get_object_or_404(Recipe, pk=pk)
@@ -67,7 +197,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     {'errors': 'Рецепт уже добавлен.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            model.objects.create(user=request.user, recipe=recipe)
+            # Список покупок пересчитывается в той же транзакции.
+            with transaction.atomic():
+                model.objects.create(user=request.user, recipe=recipe)
             serializer = RecipeMinifiedSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -100,26 +232,32 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        renderer_classes=(ShoppingListTextRenderer, ShoppingListCSVRenderer,
+                          ShoppingListJSONRenderer)
     )
     def download_shopping_cart(self, request):
-        """Скачивает список покупок в виде текстового файла."""
-        ingredients = Recipe.objects.filter(
-            shopping_cart__user=request.user
-        ).values(
-            'ingredients__name', 'ingredients__measurement_unit'
-        ).annotate(total_amount=Sum('recipe_ingredients__amount'))
-
-        shopping_list = "Список покупок:\n\n"
-        for item in ingredients:
-            name = item['ingredients__name']
-            unit = item['ingredients__measurement_unit']
-            amount = item['total_amount']
-            shopping_list += f"- {name} ({unit}) — {amount}\n"
-
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        """
+        Скачивает список покупок в формате txt, csv или json.
+
+        Суммы ингредиентов берутся из заранее посчитанного списка покупок,
+        строки читаются серверным курсором и сразу отдаются клиенту.
+        """
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
+        ).order_by(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator(chunk_size=2000)),
+            content_type=f'{renderer.media_type}; charset=utf-8'
+        )
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
         return response
 
@@ -1,20 +1,37 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.urls import reverse
+from django.utils.html import format_html
 
 from .models import Subscription, User
+from recipes.admin import LargeTableAdminMixin
 
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(LargeTableAdminMixin, UserAdmin):
     """Конфигурация админ-панели для пользователей."""
-    list_display = ('id', 'username', 'email', 'first_name', 'last_name')
-    list_filter = ('email', 'first_name')
+    list_display = ('id', 'username', 'email', 'first_name', 'last_name',
+                    'get_recipes_count', 'followers_count')
+    list_filter = ('is_staff', 'is_superuser', 'is_active')
+    # ILIKE по этим полям использует триграммные индексы user_*_trgm_idx.
     search_fields = ('username', 'email')
     ordering = ('username',)
 
+    @admin.display(description='Рецептов', ordering='recipes_count')
+    def get_recipes_count(self, obj):
+        """Возвращает количество рецептов со ссылкой на их список."""
+        url = reverse('admin:recipes_recipe_changelist')
+        return format_html(
+            '<a href="{}?author__id__exact={}">{}</a>',
+            url, obj.pk, obj.recipes_count
+        )
+
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Конфигурация админ-панели для подписок."""
     list_display = ('id', 'user', 'author')
-    search_fields = ('user__username', 'author__username')
+    list_select_related = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    search_help_text = 'Точное имя подписчика или автора.'
+    autocomplete_fields = ('user', 'author')
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name='Подписчиков'
+            ),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name='Рецептов'
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:45
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0003_user_counters'),
+        # Расширение pg_trgm.
+        ('recipes', '0004_ingredient_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper('username'),
+                    name='gin_trgm_ops'
+                ),
+                name='user_username_trgm_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper('email'),
+                    name='gin_trgm_ops'
+                ),
+                name='user_email_trgm_idx'
+            ),
+        ),
+    ]
@@ -1,8 +1,50 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import DatabaseError, models, router, transaction
+from django.db.models.functions import Upper
 
 
-class User(AbstractUser):
+NO_ROWS_UPDATED = 'Save with update_fields did not affect any rows.'
+
+
+class CountersMixin:
+    """
+    Не перезаписывает денормализованные счётчики при сохранении.
+
+    Счётчики из ``counter_fields`` меняются только запросами
+    ``UPDATE ... SET count = count + 1``. Обычный ``save()`` записал бы
+    значения, прочитанные при загрузке объекта, и потерял бы изменения,
+    сделанные за это время другими запросами. Если строку успели
+    удалить, объект вставляется заново, как при обычном ``save()``.
+    """
+    counter_fields = ()
+
+    def save(self, **kwargs):
+        if self._state.adding or kwargs.get('update_fields') is not None:
+            super().save(**kwargs)
+            return
+        update_fields = [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.name not in self.counter_fields
+        ]
+        try:
+            super().save(**kwargs, update_fields=update_fields)
+        except DatabaseError as error:
+            # С update_fields Django не вставляет удалённую строку заново.
+            if str(error) != NO_ROWS_UPDATED:
+                raise
+            # Ошибку вызвал Django, а не база данных: транзакция цела,
+            # но уже помечена для отката.
+            using = kwargs.get('using') or router.db_for_write(
+                type(self), instance=self
+            )
+            if transaction.get_connection(using).in_atomic_block:
+                transaction.set_rollback(False, using=using)
+            super().save(**kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     """Кастомная модель пользователя."""
     email = models.EmailField(
         'Адрес электронной почты',
@@ -23,14 +65,39 @@ class User(AbstractUser):
         blank=True,
         null=True,
     )
+    avatar_variants = models.JSONField(
+        'Уменьшенные копии аватара',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    recipes_count = models.IntegerField(
+        'Рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.IntegerField(
+        'Подписчиков',
+        default=0,
+        editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
+    counter_fields = ('recipes_count', 'followers_count')
+
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ('username',)
+        indexes = [
+            # Поиск в админке: UPPER(username) LIKE UPPER('%x%').
+            GinIndex(OpClass(Upper('username'), name='gin_trgm_ops'),
+                     name='user_username_trgm_idx'),
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'),
+                     name='user_email_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.username
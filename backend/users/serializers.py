@@ -3,7 +3,7 @@ from rest_framework import serializers
 
 from .models import Subscription, User
 from recipes.models import Recipe
-from recipes.fields import Base64ImageField
+from recipes.fields import Base64ImageField, ImageSrcsetField
 
 
 class AvatarSerializer(serializers.ModelSerializer):
@@ -30,61 +30,91 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         )
 
 
+def load_subscriptions(request, authors):
+    """
+    Загружает подписки текущего пользователя на переданных авторов.
+
+    Результат хранится на объекте запроса, поэтому все сериализаторы
+    одного ответа используют общий набор подписок, а для ещё
+    не проверенных авторов делается один запрос ``author_id IN (...)``.
+    """
+    subscriptions = getattr(request, '_subscriptions', None)
+    if subscriptions is None:
+        subscriptions = request._subscriptions = {}
+    if not request.user.is_authenticated:
+        return subscriptions
+    author_ids = {author.pk for author in authors} - subscriptions.keys()
+    if author_ids:
+        subscribed_ids = set(Subscription.objects.filter(
+            user=request.user, author_id__in=author_ids
+        ).values_list('author_id', flat=True))
+        subscriptions.update(
+            (author_id, author_id in subscribed_ids)
+            for author_id in author_ids
+        )
+    return subscriptions
+
+
+class CustomUserListSerializer(serializers.ListSerializer):
+    """Список пользователей с пакетной проверкой подписок."""
+
+    def to_representation(self, data):
+        request = self.context.get('request')
+        if request is not None:
+            data = list(data.all() if hasattr(data, 'all') else data)
+            load_subscriptions(request, [
+                user for user in data if not hasattr(user, 'is_subscribed')
+            ])
+        return super().to_representation(data)
+
+
 class CustomUserSerializer(UserSerializer):
     """Сериализатор для просмотра профиля пользователя."""
     is_subscribed = serializers.SerializerMethodField(read_only=True)
+    avatar_srcset = ImageSrcsetField('avatar')
 
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'avatar')
+                  'is_subscribed', 'avatar', 'avatar_srcset')
+        list_serializer_class = CustomUserListSerializer
 
     def get_is_subscribed(self, obj):
         """Проверяет, подписан ли текущий пользователь на просматриваемого."""
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return Subscription.objects.filter(
-                user=request.user, author=obj
-            ).exists()
+            return load_subscriptions(request, [obj])[obj.pk]
         return False
 
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
     """Урезанный сериализатор для рецептов в подписках."""
+    image_srcset = ImageSrcsetField('image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
 
 
 class SubscriptionSerializer(CustomUserSerializer):
     """Сериализатор для отображения подписок."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta(CustomUserSerializer.Meta):
-        fields = (
-            CustomUserSerializer.Meta.fields + ('recipes', 'recipes_count')
+        fields = CustomUserSerializer.Meta.fields + (
+            'recipes', 'recipes_count', 'followers_count'
         )
         read_only_fields = ('email', 'username', 'first_name', 'last_name')
 
     def get_recipes(self, obj):
         """Получает ограниченное количество рецептов автора."""
-        recipes_limit = self.context.get('request').query_params.get(
-            'recipes_limit'
-        )
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            try:
-                recipes = recipes[:int(recipes_limit)]
-            except ValueError:
-                raise serializers.ValidationError(
-                    {
-                        'recipes_limit': 'Параметр recipes_limit должен '
-                                         'быть целым числом.'
-                    }
-                )
+        recipes = getattr(obj, 'recipes_preview', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            recipes_limit = self.context.get('recipes_limit')
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         return RecipeMinifiedSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        """Считает общее количество рецептов у автора."""
-        return obj.recipes.count()
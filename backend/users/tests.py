@@ -0,0 +1,176 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import Subscription, User
+from recipes.models import Recipe
+
+
+class SubscriptionQueryCountTests(TestCase):
+    """Проверяет пакетную проверку подписок в списках пользователей."""
+    USERS_COUNT = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Reader', last_name='Reader',
+            is_staff=True
+        )
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                first_name='Author', last_name='Author'
+            )
+            for i in range(cls.USERS_COUNT)
+        ]
+        Subscription.objects.bulk_create([
+            Subscription(user=cls.user, author=author)
+            for author in cls.authors[::2]
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_user_list_loads_subscriptions_once(self):
+        for limit in (2, self.USERS_COUNT + 1):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(3):
+                    response = self.client.get(
+                        '/api/users/', {'limit': limit}
+                    )
+                self.assertEqual(len(response.data['results']), limit)
+        flags = {
+            item['id']: item['is_subscribed']
+            for item in response.data['results']
+        }
+        for index, author in enumerate(self.authors):
+            self.assertEqual(flags[author.id], index % 2 == 0)
+        self.assertFalse(flags[self.user.id])
+
+    def test_user_detail(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/users/{self.authors[0].id}/')
+        self.assertTrue(response.data['is_subscribed'])
+
+    def test_subscriptions_do_not_query_subscription_flags(self):
+        response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(
+            response.data['count'], len(self.authors[::2])
+        )
+        self.assertTrue(all(
+            item['is_subscribed'] for item in response.data['results']
+        ))
+
+
+class SubscriptionsEndpointTests(TestCase):
+    """Проверяет выдачу подписок с превью рецептов."""
+    AUTHORS_COUNT = 4
+    RECIPES_PER_AUTHOR = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Reader', last_name='Reader'
+        )
+        cls.authors = []
+        for i in range(cls.AUTHORS_COUNT):
+            author = User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                first_name='Author', last_name='Author'
+            )
+            for j in range(cls.RECIPES_PER_AUTHOR):
+                Recipe.objects.create(
+                    author=author, name=f'рецепт {i}-{j}',
+                    image='recipes/images/test.png', text='текст',
+                    cooking_time=10
+                )
+            Subscription.objects.create(user=cls.user, author=author)
+            cls.authors.append(author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_subscriptions_query_count(self):
+        for limit in (1, self.AUTHORS_COUNT):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(3):
+                    response = self.client.get(
+                        '/api/users/subscriptions/',
+                        {'limit': limit, 'recipes_limit': 2}
+                    )
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_recipes_limit(self):
+        response = self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': 2}
+        )
+        for item in response.data['results']:
+            self.assertEqual(len(item['recipes']), 2)
+            self.assertEqual(item['recipes_count'], self.RECIPES_PER_AUTHOR)
+            author = User.objects.get(pk=item['id'])
+            latest = author.recipes.order_by('-pub_date', '-id')[:2]
+            self.assertEqual(
+                [recipe['id'] for recipe in item['recipes']],
+                [recipe.id for recipe in latest]
+            )
+
+    def test_without_recipes_limit(self):
+        response = self.client.get('/api/users/subscriptions/')
+        for item in response.data['results']:
+            self.assertEqual(len(item['recipes']), self.RECIPES_PER_AUTHOR)
+
+    def test_invalid_recipes_limit(self):
+        for value in ('abc', '-1'):
+            with self.subTest(value=value):
+                response = self.client.get(
+                    '/api/users/subscriptions/', {'recipes_limit': value}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.data)
+
+    def test_subscribe_returns_fresh_counters(self):
+        author = User.objects.create_user(
+            username='new', email='new@example.com',
+            first_name='New', last_name='New'
+        )
+        response = self.client.post(f'/api/users/{author.id}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['followers_count'], 1)
+        self.assertTrue(response.data['is_subscribed'])
+
+    def test_invalid_recipes_limit_does_not_subscribe(self):
+        author = User.objects.create_user(
+            username='new', email='new@example.com',
+            first_name='New', last_name='New'
+        )
+        response = self.client.post(
+            f'/api/users/{author.id}/subscribe/?recipes_limit=abc'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(
+            Subscription.objects.filter(user=self.user, author=author)
+            .exists()
+        )
+
+    def test_keyset_pagination(self):
+        url, params, usernames = (
+            '/api/users/subscriptions/', {'cursor': '', 'limit': 3}, []
+        )
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            usernames.extend(
+                item['username'] for item in response.data['results']
+            )
+            url, params = response.data['next'], None
+        self.assertEqual(
+            usernames, sorted(author.username for author in self.authors)
+        )
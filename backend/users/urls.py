@@ -10,7 +10,10 @@ router_v1.register('users', CustomUserViewSet, basename='users')
 urlpatterns = [
     path(
         'users/subscriptions/',
-        CustomUserViewSet.as_view({'get': 'subscriptions'}),
+        CustomUserViewSet.as_view(
+            {'get': 'subscriptions'},
+            **CustomUserViewSet.subscriptions.kwargs
+        ),
         name='user-subscriptions'
     ),
     path('', include(router_v1.urls)),
@@ -1,30 +1,75 @@
+from django.db.models import Prefetch, Value
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 
 from .models import Subscription, User
 from .serializers import SubscriptionSerializer, AvatarSerializer
+from recipes.models import Recipe
+from recipes.pagination import SubscriptionPagination
 
 
 class CustomUserViewSet(UserViewSet):
     """ViewSet для работы с пользователями и подписками."""
 
+    def get_recipes_limit(self):
+        """Проверяет и возвращает параметр recipes_limit."""
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if not recipes_limit:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            recipes_limit = -1
+        if recipes_limit < 0:
+            raise ValidationError(
+                {
+                    'recipes_limit': 'Параметр recipes_limit должен '
+                                     'быть целым неотрицательным числом.'
+                }
+            )
+        return recipes_limit
+
+    def get_subscription_context(self):
+        return {
+            'request': self.request,
+            'recipes_limit': self.get_recipes_limit(),
+        }
+
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        pagination_class=SubscriptionPagination
     )
     def subscriptions(self, request):
-        """Возвращает авторов, на которых подписан пользователь."""
-        authors = User.objects.filter(following__user=request.user)
+        """
+        Возвращает авторов, на которых подписан пользователь.
+
+        Превью рецептов всех авторов страницы загружаются одним запросом
+        с ROW_NUMBER() OVER (PARTITION BY author_id), а их общее
+        количество хранится в счётчике автора.
+        """
+        context = self.get_subscription_context()
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        if context['recipes_limit'] is not None:
+            recipes = recipes[:context['recipes_limit']]
+        authors = User.objects.filter(
+            following__user=request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='recipes_preview')
+        )
         paginated_queryset = self.paginate_queryset(authors)
         serializer = SubscriptionSerializer(
             paginated_queryset,
             many=True,
-            context={'request': request}
+            context=context
         )
         return self.get_paginated_response(serializer.data)
 
@@ -44,6 +89,7 @@ class CustomUserViewSet(UserViewSet):
             )
 
         if request.method == 'POST':
+            context = self.get_subscription_context()
             if Subscription.objects.filter(
                 user=request.user, author=author
             ).exists():
@@ -52,9 +98,9 @@ class CustomUserViewSet(UserViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             Subscription.objects.create(user=request.user, author=author)
-            serializer = SubscriptionSerializer(
-                author, context={'request': request}
-            )
+            # Сигнал увеличил счётчик в базе, а не у загруженного автора.
+            author.refresh_from_db(fields=['followers_count'])
+            serializer = SubscriptionSerializer(author, context=context)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         subscription = Subscription.objects.filter(